@@ -69,3 +69,23 @@ export const viewsStore = defineStore('crm-views', (doctype) => {
     getView,
   }
 })
+
+// Decodes the records of a `get_data` response sent with `compact`, where each
+// list of records is sent as `{ fields, values }` with one array per record
+export function decodeRecords(records) {
+  if (!records?.fields) return records
+  return records.values.map((values) =>
+    Object.fromEntries(records.fields.map((field, i) => [field, values[i]])),
+  )
+}
+
+export function decodeData(data) {
+  if (!data?.compact) return data
+  if (data.view_type === 'kanban') {
+    data.data.forEach((column) => (column.data = decodeRecords(column.data)))
+  } else {
+    data.data = decodeRecords(data.data)
+  }
+  data.compact = false
+  return data
+}
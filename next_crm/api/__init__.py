@@ -5,6 +5,8 @@ from frappe.translate import get_all_translations
 from frappe.utils import cstr
 from frappe.utils.telemetry import POSTHOG_HOST_FIELD, POSTHOG_PROJECT_FIELD
 
+from next_crm.utils import SALES_TEAM_ROLES, get_role_users
+
 
 @frappe.whitelist(allow_guest=True)
 def get_translations():
@@ -63,12 +65,7 @@ def check_app_permission():
     if frappe.session.user == "Administrator":
         return True
 
-    roles = frappe.get_roles()
-    if any(
-        role
-        in ["System Manager", "Sales User", "Sales Manager", "Sales Master Manager"]
-        for role in roles
-    ):
+    if frappe.session.user in get_role_users(["System Manager", *SALES_TEAM_ROLES]):
         return True
 
     return False
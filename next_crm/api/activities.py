@@ -1,10 +1,76 @@
+import heapq
 import json
+import re
+from html import unescape
+from itertools import islice
 
 import frappe
 from bs4 import BeautifulSoup
 from frappe import _
 from frappe.desk.form.load import get_docinfo
-from frappe.utils import get_datetime
+from frappe.utils import cint, get_datetime
+from frappe.utils.caching import site_cache
+
+from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import (
+    VERSION_ACTIVITY_TYPES,
+    get_feed,
+    is_feed_built,
+)
+
+# Fields whose changes are left out of the timeline, per doctype
+TIMELINE_AVOID_FIELDS = {
+    "Lead": [
+        "converted",
+        "response_by",
+        "sla_creation",
+        "sla",
+        "first_response_time",
+        "first_responded_on",
+    ],
+    "Opportunity": [
+        "party_name",
+        "lead",
+        "response_by",
+        "sla_creation",
+        "sla",
+        "first_response_time",
+        "first_responded_on",
+    ],
+}
+
+COMMUNICATION_FIELDS = [
+    "name",
+    "communication_type",
+    "communication_medium",
+    "creation",
+    "subject",
+    "content",
+    "sender_full_name",
+    "sender",
+    "recipients",
+    "cc",
+    "bcc",
+    "read_by_recipient",
+    "delivery_status",
+]
+
+# "Added <a href='...'>file</a>" as written by File, with the lock icon of private files
+ATTACHMENT_LOG_PATTERN = re.compile(
+    r"""^[^<]*<a\s+href=(["'])(?P<href>[^"'<>]*)\1[^<>]*>(?P<text>[^<>]*)</a>"""
+    r"""(?:\s*<i\s[^<>]*>\s*</i>)?\s*$""",
+    re.IGNORECASE,
+)
+
+ATTACHMENT_FIELDS = [
+    "name",
+    "file_name",
+    "file_type",
+    "file_url",
+    "file_size",
+    "is_private",
+    "creation",
+    "owner",
+]
 
 
 @frappe.whitelist()
@@ -18,23 +84,6 @@ def get_activities(name):
 
 
 def get_opportunity_activities(name):
-    get_docinfo("", "Opportunity", name)
-    docinfo = frappe.response["docinfo"]
-    opportunity_meta = frappe.get_meta("Opportunity")
-    opportunity_fields = {
-        field.fieldname: {"label": field.label, "options": field.options}
-        for field in opportunity_meta.fields
-    }
-    avoid_fields = [
-        "party_name",
-        "lead",
-        "response_by",
-        "sla_creation",
-        "sla",
-        "first_response_time",
-        "first_responded_on",
-    ]
-
     doc = frappe.db.get_values(
         "Opportunity", name, ["creation", "owner", "opportunity_from", "party_name"]
     )[0]
@@ -65,148 +114,7 @@ def get_opportunity_activities(name):
         }
     )
 
-    docinfo.versions.reverse()
-
-    for version in docinfo.versions:
-        data = json.loads(version.data)
-        if not data.get("changed"):
-            continue
-
-        if change := data.get("changed")[0]:
-            field = opportunity_fields.get(change[0], None)
-
-            if (
-                not field
-                or change[0] in avoid_fields
-                or (not change[1] and not change[2])
-            ):
-                continue
-
-            field_label = field.get("label") or change[0]
-            field_option = field.get("options") or None
-
-            activity_type = "changed"
-            data = {
-                "field": change[0],
-                "field_label": field_label,
-                "old_value": change[1],
-                "value": change[2],
-            }
-
-            if not change[1] and change[2]:
-                activity_type = "added"
-                data = {
-                    "field": change[0],
-                    "field_label": field_label,
-                    "value": change[2],
-                }
-            elif change[1] and not change[2]:
-                activity_type = "removed"
-                data = {
-                    "field": change[0],
-                    "field_label": field_label,
-                    "value": change[1],
-                }
-
-        activity = {
-            "activity_type": activity_type,
-            "creation": version.creation,
-            "owner": version.owner,
-            "data": data,
-            "is_lead": False,
-            "options": field_option,
-        }
-        activities.append(activity)
-
-    for comment in docinfo.comments:
-        activity = {
-            "name": comment.name,
-            "activity_type": "comment",
-            "creation": comment.creation,
-            "owner": comment.owner,
-            "content": comment.content,
-            "attachments": get_attachments("Comment", comment.name),
-            "is_lead": False,
-        }
-        activities.append(activity)
-
-    for info_log in docinfo.info_logs:
-        activity = {
-            "name": info_log.name,
-            "activity_type": "comment",
-            "creation": info_log.creation,
-            "owner": info_log.owner,
-            "content": info_log.content,
-            "attachments": get_attachments("Comment", info_log.name),
-            "is_lead": False,
-        }
-        activities.append(activity)
-
-    for communication in docinfo.communications + docinfo.automated_messages:
-        activity = {
-            "activity_type": "communication",
-            "communication_type": communication.communication_type,
-            "creation": communication.creation,
-            "data": {
-                "subject": communication.subject,
-                "content": communication.content,
-                "sender_full_name": communication.sender_full_name,
-                "sender": communication.sender,
-                "recipients": communication.recipients,
-                "cc": communication.cc,
-                "bcc": communication.bcc,
-                "attachments": get_attachments("Communication", communication.name),
-                "read_by_recipient": communication.read_by_recipient,
-                "delivery_status": communication.delivery_status,
-            },
-            "is_lead": False,
-        }
-        activities.append(activity)
-
-    if "frappe_gmail_thread" in frappe.get_installed_apps():
-        from frappe_gmail_thread.api.activity import get_linked_gmail_threads
-
-        threads = get_linked_gmail_threads("Opportunity", name)
-
-        for thread in threads:
-            activity = {
-                "activity_type": "communication",
-                "communication_type": "Email",
-                "creation": thread["template_data"]["doc"]["creation"],
-                "data": {
-                    "subject": thread["template_data"]["doc"]["subject"],
-                    "content": thread["template_data"]["doc"]["content"],
-                    "sender_full_name": thread["template_data"]["doc"][
-                        "sender_full_name"
-                    ],
-                    "sender": thread["template_data"]["doc"]["sender"],
-                    "recipients": thread["template_data"]["doc"]["recipients"],
-                    "cc": thread["template_data"]["doc"]["cc"],
-                    "bcc": thread["template_data"]["doc"]["bcc"],
-                    "attachments": thread["template_data"]["doc"]["attachments"],
-                    "read_by_recipient": thread["template_data"]["doc"][
-                        "read_by_recipient"
-                    ],
-                    "delivery_status": thread["template_data"]["doc"][
-                        "delivery_status"
-                    ],
-                },
-                "is_lead": False,
-            }
-            activities.append(activity)
-
-    for attachment_log in docinfo.attachment_logs:
-        activity = {
-            "name": attachment_log.name,
-            "activity_type": "attachment_log",
-            "creation": attachment_log.creation,
-            "owner": attachment_log.owner,
-            "data": parse_attachment_log(
-                attachment_log.content, attachment_log.comment_type
-            ),
-            "is_lead": False,
-        }
-        activities.append(activity)
+    activities += get_timeline_activities("Opportunity", name)
 
     calls = calls + get_linked_calls(name)
     notes = get_linked_notes(name)["root_notes"]
@@ -214,30 +122,15 @@ def get_opportunity_activities(name):
     events = events + get_linked_events(name)
     attachments = attachments + get_attachments("Opportunity", name)
 
-    activities.sort(key=lambda x: x["creation"], reverse=True)
-    activities = handle_multiple_versions(activities)
+    activities.sort(key=lambda x: get_datetime(x["creation"]), reverse=True)
+    if not is_feed_built():
+        activities = handle_multiple_versions(activities)
     notes.sort(key=lambda x: x["added_on"], reverse=True)
 
     return activities, calls, notes, todos, events, attachments, []
 
 
 def get_lead_activities(name, get_events=True, exclude_crm_note_attachments=False):
-    get_docinfo("", "Lead", name)
-    docinfo = frappe.response["docinfo"]
-    lead_meta = frappe.get_meta("Lead")
-    lead_fields = {
-        field.fieldname: {"label": field.label, "options": field.options}
-        for field in lead_meta.fields
-    }
-    avoid_fields = [
-        "converted",
-        "response_by",
-        "sla_creation",
-        "sla",
-        "first_response_time",
-        "first_responded_on",
-    ]
-
     doc = frappe.db.get_values("Lead", name, ["creation", "owner"])[0]
     activities = [
         {
@@ -249,156 +142,474 @@ def get_lead_activities(name, get_events=True, exclude_crm_note_attachments=Fals
         }
     ]
 
+    activities += get_timeline_activities("Lead", name, get_events)
+
+    calls = get_linked_calls(name)
+    linked_notes = get_linked_notes(name)
+    notes = linked_notes["root_notes"]
+    todos = get_linked_todos(name)
+    events = get_linked_events(name)
+    attachments = get_attachments("Lead", name)
+    opportunities = get_linked_opportunities("Lead", name)
+
+    if exclude_crm_note_attachments:
+        filenames_to_exclude = linked_notes["attached_file_names"]
+        attachments = [a for a in attachments if a.name not in filenames_to_exclude]
+
+    activities.sort(key=lambda x: get_datetime(x["creation"]), reverse=True)
+    if not is_feed_built():
+        activities = handle_multiple_versions(activities)
+    notes.sort(key=lambda x: x["added_on"], reverse=True)
+
+    return activities, calls, notes, todos, events, attachments, opportunities
+
+
+def get_timeline_activities(doctype, name, get_events=True):
+    """
+    Returns the versions, comments, emails and attachment logs of `doctype`
+    `name`. Once the CRM Activity Feed is built they are read from it, with
+    the versions already grouped, otherwise from the document's docinfo.
+    """
+    is_lead = doctype == "Lead"
+    activities = get_gmail_thread_activities(doctype, name, is_lead)
+
+    if is_feed_built():
+        frappe.has_permission(doctype, "read", name, throw=True)
+        return get_feed(doctype, name, skip_events=not get_events) + activities
+
+    get_docinfo("", doctype, name)
+    docinfo = frappe.response["docinfo"]
+    fields = get_timeline_fields(doctype)
+
     docinfo.versions.reverse()
 
     for version in docinfo.versions:
-        data = json.loads(version.data)
-        if not data.get("changed"):
-            continue
+        activity = get_version_activity(version, doctype, fields)
+        if activity:
+            activities.append(activity)
 
-        if change := data.get("changed")[0]:
-            field = lead_fields.get(change[0], None)
+    comments = docinfo.comments if is_lead else docinfo.comments + docinfo.info_logs
+    attachments = get_attachments_map("Comment", [c.name for c in comments])
+    for comment in comments:
+        activities.append(
+            get_comment_activity(comment, is_lead, attachments.get(comment.name, []))
+        )
 
-            if (
-                not field
-                or change[0] in avoid_fields
-                or (not change[1] and not change[2])
-            ):
-                continue
+    communications = [
+        communication
+        for communication in docinfo.communications + docinfo.automated_messages
+        if get_events or communication.get("communication_medium") != "Event"
+    ]
+    attachments = get_attachments_map("Communication", [c.name for c in communications])
+    for communication in communications:
+        activities.append(
+            get_communication_activity(
+                communication, is_lead, attachments.get(communication.name, [])
+            )
+        )
 
-            field_label = field.get("label") or change[0]
-            field_option = field.get("options") or None
+    for attachment_log in docinfo.attachment_logs:
+        activities.append(get_attachment_log_activity(attachment_log, is_lead))
 
-            activity_type = "changed"
-            data = {
-                "field": change[0],
-                "field_label": field_label,
-                "old_value": change[1],
-                "value": change[2],
-            }
+    return activities
 
-            if not change[1] and change[2]:
-                activity_type = "added"
-                data = {
-                    "field": change[0],
-                    "field_label": field_label,
-                    "value": change[2],
-                }
-            elif change[1] and not change[2]:
-                activity_type = "removed"
-                data = {
-                    "field": change[0],
-                    "field_label": field_label,
-                    "value": change[1],
-                }
 
-        activity = {
-            "activity_type": activity_type,
-            "creation": version.creation,
-            "owner": version.owner,
-            "data": data,
-            "is_lead": True,
-            "options": field_option,
-        }
-        activities.append(activity)
+@frappe.whitelist()
+def get_activity_page(name, cursor=None, page_length=20):
+    """
+    Returns a page of the timeline of a Lead or Opportunity, newest first, and
+    the cursor of the next page, or None on the last page.
 
-    for comment in docinfo.comments:
-        activity = {
-            "name": comment.name,
-            "activity_type": "comment",
-            "creation": comment.creation,
-            "owner": comment.owner,
-            "content": comment.content,
-            "attachments": get_attachments("Comment", comment.name),
-            "is_lead": True,
-        }
-        activities.append(activity)
+    Each source (versions, comments, emails, attachment logs) is read newest
+    first, `page_length` records at a time and only as far as needed, and the
+    sources are merged by `creation`. Pass the returned `next_cursor` to get
+    the following page.
+    """
+    if frappe.db.exists("Opportunity", name):
+        doctype = "Opportunity"
+    elif frappe.db.exists("Lead", name):
+        doctype = "Lead"
+    else:
+        frappe.throw(_("Document not found"), frappe.DoesNotExistError)
 
-    for communication in docinfo.communications + docinfo.automated_messages:
-        if communication.get("communication_medium") == "Event" and not get_events:
+    frappe.has_permission(doctype, "read", name, throw=True)
+
+    cursor = frappe.parse_json(cursor) if cursor else None
+    page_length = cint(page_length) or 20
+
+    sources = []
+    if doctype == "Opportunity":
+        opportunity = frappe.db.get_value(
+            "Opportunity",
+            name,
+            ["creation", "owner", "opportunity_from", "party_name"],
+            as_dict=True,
+        )
+        creation_text = "created this opportunity"
+        if opportunity.opportunity_from == "Lead" and opportunity.party_name:
+            sources += get_timeline_sources(
+                "Lead", opportunity.party_name, cursor, page_length, get_events=False
+            )
+            creation_text = "converted the lead to this opportunity"
+
+        sources += get_timeline_sources("Opportunity", name, cursor, page_length)
+        sources.append(
+            [
+                {
+                    "activity_type": "creation",
+                    "creation": opportunity.creation,
+                    "owner": opportunity.owner,
+                    "data": creation_text,
+                    "is_lead": False,
+                }
+            ]
+        )
+    else:
+        sources += get_timeline_sources("Lead", name, cursor, page_length)
+
+    seen = set(cursor.get("keys") or []) if cursor else set()
+    activities = []
+    for activity in heapq.merge(
+        *sources, key=lambda x: get_datetime(x["creation"]), reverse=True
+    ):
+        key = get_activity_key(activity)
+        if key in seen:
             continue
-        activity = {
-            "activity_type": "communication",
-            "communication_type": communication.communication_type,
-            "creation": communication.creation,
-            "data": {
-                "subject": communication.subject,
-                "content": communication.content,
-                "sender_full_name": communication.sender_full_name,
-                "sender": communication.sender,
-                "recipients": communication.recipients,
-                "cc": communication.cc,
-                "bcc": communication.bcc,
-                "attachments": get_attachments("Communication", communication.name),
-                "read_by_recipient": communication.read_by_recipient,
-                "delivery_status": communication.delivery_status,
-            },
-            "is_lead": True,
-        }
+        if cursor and get_datetime(activity["creation"]) > get_datetime(
+            cursor["creation"]
+        ):
+            continue
+
+        seen.add(key)
         activities.append(activity)
+        if len(activities) > page_length:
+            break
+
+    next_cursor = None
+    if len(activities) > page_length:
+        activities = activities[:page_length]
+        last_creation = get_datetime(activities[-1]["creation"])
+        next_cursor = {
+            "creation": str(last_creation),
+            # activities at the boundary already returned, by this page or earlier
+            "keys": [
+                get_activity_key(activity)
+                for activity in activities
+                if get_datetime(activity["creation"]) == last_creation
+            ],
+        }
+        if cursor and get_datetime(cursor["creation"]) == last_creation:
+            next_cursor["keys"] += cursor.get("keys") or []
 
-    if "frappe_gmail_thread" in frappe.get_installed_apps():
-        from frappe_gmail_thread.api.activity import get_linked_gmail_threads
+    return {
+        "activities": handle_multiple_versions(activities),
+        "next_cursor": next_cursor,
+    }
 
-        threads = get_linked_gmail_threads("Lead", name)
 
-        for thread in threads:
-            activity = {
+def get_timeline_sources(doctype, name, cursor, page_length, get_events=True):
+    """
+    Returns the timeline sources of `doctype` `name`, each an iterable of
+    activities, newest first, starting at `cursor`.
+    """
+    is_lead = doctype == "Lead"
+    sources = get_record_sources(doctype, name, cursor, page_length, get_events)
+    sources.append(
+        sorted(
+            get_gmail_thread_activities(doctype, name, is_lead),
+            key=lambda x: get_datetime(x["creation"]),
+            reverse=True,
+        )
+    )
+
+    if is_lead:
+        lead = frappe.db.get_value("Lead", name, ["creation", "owner"], as_dict=True)
+        sources.append(
+            [
+                {
+                    "activity_type": "creation",
+                    "creation": lead.creation,
+                    "owner": lead.owner,
+                    "data": "created this lead",
+                    "is_lead": True,
+                }
+            ]
+        )
+
+    return sources
+
+
+def get_record_sources(doctype, name, cursor, page_length, get_events=True):
+    """
+    Returns the versions, comments, emails and attachment logs of `doctype`
+    `name` as activity iterables, newest first, starting at `cursor`.
+    """
+    fields = get_timeline_fields(doctype)
+    is_lead = doctype == "Lead"
+    before = cursor.get("creation") if cursor else None
+
+    versions = iter_timeline_records(
+        "Version",
+        {"ref_doctype": doctype, "docname": name},
+        ["name", "data", "creation", "owner"],
+        before,
+        page_length,
+    )
+    comment_types = ["Comment"] if is_lead else ["Comment", "Info"]
+    comments = iter_timeline_records(
+        "Comment",
+        {
+            "reference_doctype": doctype,
+            "reference_name": name,
+            "comment_type": ["in", comment_types],
+        },
+        ["name", "creation", "owner", "content"],
+        before,
+        page_length,
+    )
+    communication_filters = {
+        "reference_doctype": doctype,
+        "reference_name": name,
+        "communication_type": ["in", ["Communication", "Automated Message"]],
+    }
+    if not get_events:
+        communication_filters["communication_medium"] = ["!=", "Event"]
+    communications = iter_timeline_records(
+        "Communication",
+        communication_filters,
+        COMMUNICATION_FIELDS,
+        before,
+        page_length,
+    )
+    # emails linked through the timeline links, shown once with the ones above
+    linked_communications = iter_timeline_records(
+        "Communication",
+        [
+            ["Communication Link", "link_doctype", "=", doctype],
+            ["Communication Link", "link_name", "=", name],
+            ["communication_type", "in", ["Communication", "Automated Message"]],
+            *([] if get_events else [["communication_medium", "!=", "Event"]]),
+        ],
+        COMMUNICATION_FIELDS,
+        before,
+        page_length,
+    )
+    attachment_logs = iter_timeline_records(
+        "Comment",
+        {
+            "reference_doctype": doctype,
+            "reference_name": name,
+            "comment_type": ["in", ["Attachment", "Attachment Removed"]],
+        },
+        ["name", "creation", "owner", "content", "comment_type"],
+        before,
+        page_length,
+    )
+
+    return [
+        filter(None, (get_version_activity(v, doctype, fields) for v in versions)),
+        (
+            get_comment_activity(comment, is_lead, attachments)
+            for comment, attachments in iter_with_attachments(
+                "Comment", comments, page_length
+            )
+        ),
+        (
+            get_communication_activity(communication, is_lead, attachments)
+            for communication, attachments in iter_with_attachments(
+                "Communication", communications, page_length
+            )
+        ),
+        (
+            get_communication_activity(communication, is_lead, attachments)
+            for communication, attachments in iter_with_attachments(
+                "Communication", linked_communications, page_length
+            )
+        ),
+        (get_attachment_log_activity(log, is_lead) for log in attachment_logs),
+    ]
+
+
+def iter_timeline_records(doctype, filters, fields, before, page_length):
+    """
+    Yields the `doctype` records matching `filters` created at or before
+    `before`, newest first, reading `page_length` records at a time.
+    """
+    if isinstance(filters, dict):
+        filters = [
+            [key, *value] if isinstance(value, list) else [key, "=", value]
+            for key, value in filters.items()
+        ]
+    if before:
+        filters = [*filters, ["creation", "<=", before]]
+
+    start = 0
+    while True:
+        records = frappe.get_all(
+            doctype,
+            filters=filters,
+            fields=fields,
+            order_by="creation desc, name desc",
+            start=start,
+            page_length=page_length,
+        )
+        yield from records
+
+        if len(records) < page_length:
+            return
+        start += page_length
+
+
+def iter_with_attachments(doctype, records, chunk_size):
+    """
+    Yields each of `records` with its attachments, loading the attachments of
+    `chunk_size` records at a time.
+    """
+    records = iter(records)
+    while chunk := list(islice(records, chunk_size)):
+        attachments = get_attachments_map(doctype, [record.name for record in chunk])
+        for record in chunk:
+            yield record, attachments.get(record.name, [])
+
+
+def get_activity_key(activity):
+    return f"{activity['activity_type']}:{activity.get('name') or activity['creation']}"
+
+
+def get_timeline_fields(doctype):
+    return {
+        field.fieldname: {"label": field.label, "options": field.options}
+        for field in frappe.get_meta(doctype).fields
+    }
+
+
+def get_version_activity(version, doctype, fields):
+    """Returns the timeline activity of a Version, or None if it isn't shown"""
+    data = json.loads(version.data)
+    if not data.get("changed"):
+        return None
+
+    change = data.get("changed")[0]
+    field = fields.get(change[0], None)
+    if (
+        not field
+        or change[0] in TIMELINE_AVOID_FIELDS[doctype]
+        or (not change[1] and not change[2])
+    ):
+        return None
+
+    field_label = field.get("label") or change[0]
+    activity_type = "changed"
+    data = {
+        "field": change[0],
+        "field_label": field_label,
+        "old_value": change[1],
+        "value": change[2],
+    }
+
+    if not change[1] and change[2]:
+        activity_type = "added"
+        data = {"field": change[0], "field_label": field_label, "value": change[2]}
+    elif change[1] and not change[2]:
+        activity_type = "removed"
+        data = {"field": change[0], "field_label": field_label, "value": change[1]}
+
+    return {
+        "name": version.name,
+        "activity_type": activity_type,
+        "creation": version.creation,
+        "owner": version.owner,
+        "data": data,
+        "is_lead": doctype == "Lead",
+        "options": field.get("options") or None,
+    }
+
+
+def get_comment_activity(comment, is_lead, attachments=None):
+    if attachments is None:
+        attachments = get_attachments("Comment", comment.name)
+
+    return {
+        "name": comment.name,
+        "activity_type": "comment",
+        "creation": comment.creation,
+        "owner": comment.owner,
+        "content": comment.content,
+        "attachments": attachments,
+        "is_lead": is_lead,
+    }
+
+
+def get_communication_activity(communication, is_lead, attachments=None):
+    if attachments is None:
+        attachments = get_attachments("Communication", communication.name)
+
+    return {
+        "name": communication.name,
+        "activity_type": "communication",
+        "communication_type": communication.communication_type,
+        "creation": communication.creation,
+        "data": {
+            "subject": communication.subject,
+            "content": communication.content,
+            "sender_full_name": communication.sender_full_name,
+            "sender": communication.sender,
+            "recipients": communication.recipients,
+            "cc": communication.cc,
+            "bcc": communication.bcc,
+            "attachments": attachments,
+            "read_by_recipient": communication.read_by_recipient,
+            "delivery_status": communication.delivery_status,
+        },
+        "is_lead": is_lead,
+    }
+
+
+def get_attachment_log_activity(attachment_log, is_lead):
+    return {
+        "name": attachment_log.name,
+        "activity_type": "attachment_log",
+        "creation": attachment_log.creation,
+        "owner": attachment_log.owner,
+        "data": parse_attachment_log(
+            attachment_log.content, attachment_log.comment_type, attachment_log.name
+        ),
+        "is_lead": is_lead,
+    }
+
+
+def get_gmail_thread_activities(doctype, name, is_lead):
+    if "frappe_gmail_thread" not in frappe.get_installed_apps():
+        return []
+
+    from frappe_gmail_thread.api.activity import get_linked_gmail_threads
+
+    activities = []
+    for thread in get_linked_gmail_threads(doctype, name):
+        doc = thread["template_data"]["doc"]
+        activities.append(
+            {
+                "name": doc.get("name"),
                 "activity_type": "communication",
                 "communication_type": "Email",
-                "creation": thread["template_data"]["doc"]["creation"],
+                "creation": doc["creation"],
                 "data": {
-                    "subject": thread["template_data"]["doc"]["subject"],
-                    "content": thread["template_data"]["doc"]["content"],
-                    "sender_full_name": thread["template_data"]["doc"][
-                        "sender_full_name"
-                    ],
-                    "sender": thread["template_data"]["doc"]["sender"],
-                    "recipients": thread["template_data"]["doc"]["recipients"],
-                    "cc": thread["template_data"]["doc"]["cc"],
-                    "bcc": thread["template_data"]["doc"]["bcc"],
-                    "attachments": thread["template_data"]["doc"]["attachments"],
-                    "read_by_recipient": thread["template_data"]["doc"][
-                        "read_by_recipient"
-                    ],
-                    "delivery_status": thread["template_data"]["doc"][
-                        "delivery_status"
-                    ],
+                    "subject": doc["subject"],
+                    "content": doc["content"],
+                    "sender_full_name": doc["sender_full_name"],
+                    "sender": doc["sender"],
+                    "recipients": doc["recipients"],
+                    "cc": doc["cc"],
+                    "bcc": doc["bcc"],
+                    "attachments": doc["attachments"],
+                    "read_by_recipient": doc["read_by_recipient"],
+                    "delivery_status": doc["delivery_status"],
                 },
-                "is_lead": True,
+                "is_lead": is_lead,
             }
-            activities.append(activity)
-
-    for attachment_log in docinfo.attachment_logs:
-        activity = {
-            "name": attachment_log.name,
-            "activity_type": "attachment_log",
-            "creation": attachment_log.creation,
-            "owner": attachment_log.owner,
-            "data": parse_attachment_log(
-                attachment_log.content, attachment_log.comment_type
-            ),
-            "is_lead": True,
-        }
-        activities.append(activity)
-
-    calls = get_linked_calls(name)
-    linked_notes = get_linked_notes(name)
-    notes = linked_notes["root_notes"]
-    todos = get_linked_todos(name)
-    events = get_linked_events(name)
-    attachments = get_attachments("Lead", name)
-    opportunities = get_linked_opportunities("Lead", name)
-
-    if exclude_crm_note_attachments:
-        filenames_to_exclude = linked_notes["attached_file_names"]
-        attachments = [a for a in attachments if a.name not in filenames_to_exclude]
-
-    activities.sort(key=lambda x: x["creation"], reverse=True)
-    activities = handle_multiple_versions(activities)
-    notes.sort(key=lambda x: x["added_on"], reverse=True)
+        )
 
-    return activities, calls, notes, todos, events, attachments, opportunities
+    return activities
 
 
 def get_attachments(doctype, name):
@@ -406,60 +617,59 @@ def get_attachments(doctype, name):
         frappe.db.get_all(
             "File",
             filters={"attached_to_doctype": doctype, "attached_to_name": name},
-            fields=[
-                "name",
-                "file_name",
-                "file_type",
-                "file_url",
-                "file_size",
-                "is_private",
-                "creation",
-                "owner",
-            ],
+            fields=ATTACHMENT_FIELDS,
         )
         or []
     )
 
 
-def handle_multiple_versions(versions):
-    activities = []
-    grouped_versions = []
-    old_version = None
-    for version in versions:
-        is_version = version["activity_type"] in ["changed", "added", "removed"]
-        if not is_version:
-            activities.append(version)
-        if not old_version:
-            old_version = version
-            if is_version:
-                grouped_versions.append(version)
-            continue
-        if (
-            is_version
-            and old_version.get("owner")
-            and version["owner"] == old_version["owner"]
-        ):
-            grouped_versions.append(version)
+def get_attachments_map(doctype, names):
+    """Returns the files attached to the `doctype` records `names`, by record name"""
+    attachments = {}
+    if not names:
+        return attachments
+
+    files = frappe.db.get_all(
+        "File",
+        filters={"attached_to_doctype": doctype, "attached_to_name": ["in", names]},
+        fields=[*ATTACHMENT_FIELDS, "attached_to_name"],
+    )
+    for file in files:
+        attachments.setdefault(file.pop("attached_to_name"), []).append(file)
+
+    return attachments
+
+
+def handle_multiple_versions(activities):
+    """
+    Returns `activities` with each run of consecutive versions by the same
+    owner folded into its first version, the rest listed in its
+    `other_versions`. `activities` itself is left unchanged.
+    """
+    grouped = []
+    previous = None
+    head = None
+    for activity in activities:
+        if is_same_version_run(previous, activity):
+            if head is None:
+                head = grouped[-1] = {**grouped[-1], "other_versions": []}
+            head["other_versions"].append(activity)
         else:
-            if grouped_versions:
-                activities.append(parse_grouped_versions(grouped_versions))
-            grouped_versions = []
-            if is_version:
-                grouped_versions.append(version)
-        old_version = version
-        if version == versions[-1] and grouped_versions:
-            activities.append(parse_grouped_versions(grouped_versions))
+            grouped.append(activity)
+            head = None
+        previous = activity
 
-    return activities
+    return grouped
 
 
-def parse_grouped_versions(versions):
-    version = versions[0]
-    if len(versions) == 1:
-        return version
-    other_versions = versions[1:]
-    version["other_versions"] = other_versions
-    return version
+def is_same_version_run(previous, activity):
+    return (
+        previous is not None
+        and previous["activity_type"] in VERSION_ACTIVITY_TYPES
+        and activity["activity_type"] in VERSION_ACTIVITY_TYPES
+        and bool(previous.get("owner"))
+        and activity["owner"] == previous["owner"]
+    )
 
 
 def get_linked_calls(name):
@@ -561,34 +771,32 @@ def get_linked_todos(name):
         fields=fields,
     )
 
-    for todo in todos:
-        if todo.get("custom_linked_event", None):
-            event = frappe.db.get_value(
+    event_names = list(
+        {todo.custom_linked_event for todo in todos if todo.get("custom_linked_event")}
+    )
+    events = {}
+    if event_names:
+        events = {
+            event.name: event
+            for event in frappe.db.get_all(
                 "Event",
-                todo["custom_linked_event"],
-                ["name", "sync_with_google_calendar", "google_calendar"],
+                filters={"name": ["in", event_names]},
+                fields=["name", "sync_with_google_calendar", "google_calendar"],
             )
+        }
+    participants = get_event_participants_map(list(events))
+
+    for todo in todos:
+        if todo.get("custom_linked_event", None):
+            event = events.get(todo["custom_linked_event"])
             if not event:
                 continue
             todo["_event"] = {
-                "name": event[0],
-                "sync_with_google_calendar": event[1],
-                "google_calendar": event[2],
+                "name": event.name,
+                "sync_with_google_calendar": event.sync_with_google_calendar,
+                "google_calendar": event.google_calendar,
+                "event_participants": participants.get(event.name, []),
             }
-            event_participants = frappe.db.get_all(
-                "Event Participants",
-                filters={"parent": todo["_event"]["name"]},
-                fields=["reference_doctype", "reference_docname", "email"],
-            )
-            event_participants = [
-                {
-                    "reference_doctype": participant["reference_doctype"],
-                    "reference_docname": participant["reference_docname"],
-                    "email": participant["email"],
-                }
-                for participant in event_participants
-            ]
-            todo["_event"]["event_participants"] = event_participants
         else:
             todo["_event"] = None
 
@@ -615,16 +823,30 @@ def get_linked_events(name):
         ],
     )
 
+    participants = get_event_participants_map([event.name for event in events])
     for event in events:
-        event["event_participants"] = frappe.db.get_all(
-            "Event Participants",
-            filters={"parent": event.name},
-            fields=["reference_doctype", "reference_docname", "email"],
-        )
+        event["event_participants"] = participants.get(event.name, [])
 
     return events or []
 
 
+def get_event_participants_map(events):
+    """Returns the participants of `events`, by event name"""
+    participants = {}
+    if not events:
+        return participants
+
+    rows = frappe.db.get_all(
+        "Event Participants",
+        filters={"parent": ["in", events], "parenttype": "Event"},
+        fields=["parent", "reference_doctype", "reference_docname", "email"],
+    )
+    for row in rows:
+        participants.setdefault(row.pop("parent"), []).append(row)
+
+    return participants
+
+
 def get_linked_opportunities(doctype, name):
     opportunities = frappe.get_all(
         "Opportunity",
@@ -642,27 +864,43 @@ def get_linked_opportunities(doctype, name):
     return opportunities
 
 
-def parse_attachment_log(html, type):
+def parse_attachment_log(html, type, name=None):
+    """
+    Returns the file an attachment log comment points to. The markup File
+    writes is read with `ATTACHMENT_LOG_PATTERN`, anything else with
+    BeautifulSoup. Results are memoized by comment `name` when given.
+    """
+    if name:
+        return dict(parse_comment_attachment_log(name, html, type))
+
+    type = "added" if type == "Attachment" else "removed"
+    if "<" not in html:
+        return get_attachment_log_data(type, html.replace("Removed ", ""))
+
+    if match := ATTACHMENT_LOG_PATTERN.match(html):
+        return get_attachment_log_data(
+            type, unescape(match["text"]), unescape(match["href"])
+        )
+
     soup = BeautifulSoup(html, "html.parser")
     a_tag = soup.find("a")
-    type = "added" if type == "Attachment" else "removed"
     if not a_tag:
-        return {
-            "type": type,
-            "file_name": html.replace("Removed ", ""),
-            "file_url": "",
-            "is_private": False,
-        }
+        return get_attachment_log_data(type, html.replace("Removed ", ""))
 
-    is_private = False
-    if "private/files" in a_tag["href"]:
-        is_private = True
+    return get_attachment_log_data(type, a_tag.text, a_tag["href"])
 
+
+@site_cache(maxsize=4096)
+def parse_comment_attachment_log(name, html, type):
+    return parse_attachment_log(html, type)
+
+
+def get_attachment_log_data(type, file_name, file_url=""):
     return {
         "type": type,
-        "file_name": a_tag.text,
-        "file_url": a_tag["href"],
-        "is_private": is_private,
+        "file_name": file_name,
+        "file_url": file_url,
+        "is_private": "private/files" in file_url,
     }
 
 
@@ -724,9 +962,12 @@ def delete_attachment(filename, doctype=None, docname=None):
 
 @frappe.whitelist()
 def get_latest_activity(name: str):
-    activities, calls, notes, todos, events, attachments, opportunities = (
-        get_activities(name)
-    )
+    if is_feed_built():
+        activities, notes, todos = get_latest_feed_activities(name)
+    else:
+        activities, calls, notes, todos, events, attachments, opportunities = (
+            get_activities(name)
+        )
 
     if "docinfo" in frappe.response:
         del frappe.response["docinfo"]
@@ -776,3 +1017,45 @@ def get_latest_activity(name: str):
     filtered_activities.sort(key=lambda x: x["timestamp"], reverse=True)
 
     return filtered_activities[0]
+
+
+def get_latest_feed_activities(name):
+    """
+    Returns the newest email of `name` and its notes and todos, reading the
+    email from the CRM Activity Feed instead of building the whole timeline.
+    """
+    if frappe.db.exists("Opportunity", name):
+        doctype = "Opportunity"
+    elif frappe.db.exists("Lead", name):
+        doctype = "Lead"
+    else:
+        frappe.throw(_("Document not found"), frappe.DoesNotExistError)
+
+    frappe.has_permission(doctype, "read", name, throw=True)
+
+    references = [(doctype, name, False)]
+    if doctype == "Opportunity":
+        opportunity_from, party_name = frappe.db.get_value(
+            "Opportunity", name, ["opportunity_from", "party_name"]
+        )
+        if opportunity_from == "Lead" and party_name:
+            references.append(("Lead", party_name, True))
+
+    activities = []
+    todos = []
+    for reference_doctype, reference_name, skip_events in references:
+        is_lead = reference_doctype == "Lead"
+        activities += get_feed(
+            reference_doctype,
+            reference_name,
+            skip_events=skip_events,
+            activity_type="communication",
+            limit=1,
+        )
+        activities += get_gmail_thread_activities(
+            reference_doctype, reference_name, is_lead
+        )
+        todos += get_linked_todos(reference_name)
+
+    notes = get_linked_notes(name)["root_notes"]
+    return activities, notes, todos
@@ -6,6 +6,7 @@ from frappe.desk.doctype.notification_log.notification_log import (
 )
 from frappe.utils import now
 
+from next_crm.api.doc import update_engagement_counts
 from next_crm.ncrm.doctype.crm_notification.crm_notification import notify_user
 
 
@@ -50,6 +51,7 @@ def create_note(
             ],
         )
     new_note.insert()
+    update_engagement_counts(doctype, [docname], ["_note_count"])
     notify_mentions_ncrm(note, new_note.name, docname, doctype)
     # Doctype are fetched using 'get_cached_doc'. hence we need to clear the cache
     # to ensure the new note is reflected in the doc's child table. Without this,
@@ -248,6 +250,7 @@ def delete_note(note_name):
 
     frappe.db.delete("CRM Notification", {"notification_type_doc": note_name})
     note.delete()
+    update_engagement_counts(note.parenttype, [note.parent], ["_note_count"])
     for filename in filenames_to_delete:
         try:
             frappe.delete_doc("File", filename)
@@ -358,6 +361,7 @@ def copy_crm_notes_to_opportunity(lead, opportunity):
                     "owner": child_note.owner,
                 },
             )
+    update_engagement_counts("Opportunity", [opportunity], ["_note_count"])
     frappe.db.commit()
 
 
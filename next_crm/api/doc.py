@@ -1,23 +1,64 @@
+import csv
+import hashlib
+import io
 import json
 
 import frappe
 from frappe import _
 from frappe.custom.doctype.property_setter.property_setter import make_property_setter
-from frappe.model import no_value_fields
+from frappe.model import no_value_fields, optional_fields
 from frappe.model.document import get_controller
-from frappe.utils import make_filter_tuple
+from frappe.utils import cint, get_datetime, make_filter_tuple
+from werkzeug.wrappers import Response
 
 from next_crm.api.views import get_views
-from next_crm.ncrm.doctype.crm_form_script.crm_form_script import get_form_script
+from next_crm.indexes import LIST_VIEW_DOCTYPES
+from next_crm.ncrm.doctype.crm_assignment_index.crm_assignment_index import (
+    INDEX_LOOKUP_LIMIT,
+    INDEXED_COLUMNS,
+    get_indexed_names,
+    is_index_built,
+)
+from next_crm.ncrm.doctype.crm_form_script.crm_form_script import (
+    get_form_script,
+    get_form_script_hash,
+)
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import get_rank_view
+from next_crm.ncrm.doctype.crm_view_settings.crm_view_settings import get_compiled_view
+from next_crm.utils import (
+    get_cached_field_projection,
+    get_role_holders,
+    get_sales_team_members,
+)
+
+# Upper bound for estimated counts, see `get_kanban_column_counts`
+COUNT_ESTIMATE_CAP = 10000
+
+# Number of records read per query while exporting, see `export_data`
+EXPORT_CHUNK_SIZE = 1000
+
+# Most changed records returned by `get_data_delta` before a reload is asked
+DELTA_ROW_LIMIT = 500
+
+# Cache hash of the per doctype tokens changed by writes that keep `modified`
+LIST_VERSION_CACHE_KEY = "next_crm:list_version"
 
 
 @frappe.whitelist()
 def sort_options(doctype: str):
+    fields = get_cached_field_projection(doctype, "sort_options", build_sort_options)
+    for field in fields:
+        field["label"] = _(field["label"])
+
+    return fields
+
+
+def build_sort_options(doctype):
     fields = frappe.get_meta(doctype).fields
     fields = [field for field in fields if field.fieldtype not in no_value_fields]
     fields = [
         {
-            "label": _(field.label),
+            "label": field.label,
             "value": field.fieldname,
         }
         for field in fields
@@ -32,15 +73,21 @@ def sort_options(doctype: str):
         {"label": "Owner", "value": "owner"},
     ]
 
-    for field in standard_fields:
-        field["label"] = _(field["label"])
-        fields.append(field)
-
-    return fields
+    return fields + standard_fields
 
 
 @frappe.whitelist()
 def get_filterable_fields(doctype: str):
+    fields = get_cached_field_projection(
+        doctype, "filterable_fields", build_filterable_fields
+    )
+    for field in fields:
+        field.label = _(field.get("label"))
+
+    return fields
+
+
+def build_filterable_fields(doctype):
     allowed_fieldtypes = [
         "Check",
         "Data",
@@ -102,14 +149,21 @@ def get_filterable_fields(doctype: str):
             field["name"] = field.get("fieldname")
             fields.append(frappe._dict(field))
 
-    for field in fields:
-        field.label = _(field.get("label"))
-
     return fields
 
 
 @frappe.whitelist()
 def get_group_by_fields(doctype: str):
+    fields = get_cached_field_projection(
+        doctype, "group_by_fields", build_group_by_fields
+    )
+    for field in fields:
+        field["label"] = _(field["label"])
+
+    return fields
+
+
+def build_group_by_fields(doctype):
     allowed_fieldtypes = [
         "Check",
         "Data",
@@ -133,7 +187,7 @@ def get_group_by_fields(doctype: str):
     ]
     fields = [
         {
-            "label": _(field.label),
+            "label": field.label,
             "value": field.fieldname,
         }
         for field in fields
@@ -153,15 +207,21 @@ def get_group_by_fields(doctype: str):
         {"label": "Modified On", "value": "modified"},
     ]
 
-    for field in standard_fields:
-        field["label"] = _(field["label"])
-        fields.append(field)
-
-    return fields
+    return fields + standard_fields
 
 
 @frappe.whitelist()
 def get_quick_filters(doctype: str):
+    quick_filters = get_cached_field_projection(
+        doctype, "quick_filters", build_quick_filters
+    )
+    for quick_filter in quick_filters:
+        quick_filter["label"] = _(quick_filter["label"])
+
+    return quick_filters
+
+
+def build_quick_filters(doctype):
     meta = frappe.get_meta(doctype)
     fields = [field for field in meta.fields if field.in_standard_filter]
     quick_filters = []
@@ -175,7 +235,7 @@ def get_quick_filters(doctype: str):
                 options.insert(0, {"label": "", "value": ""})
         quick_filters.append(
             {
-                "label": _(field.get("label")),
+                "label": field.get("label"),
                 "fieldname": field.get("fieldname"),
                 "fieldtype": field.get("fieldtype"),
                 "options": options,
@@ -195,6 +255,33 @@ def get_quick_filters(doctype: str):
     return quick_filters
 
 
+@frappe.whitelist()
+def get_list_view_meta(doctype: str, content_hash=None):
+    """
+    Returns the views, filters, sort and group by options and scripts a list
+    page needs to render, along with a hash of the content. If `content_hash`
+    matches the current hash only the hash is returned, so the client can
+    keep using its copy.
+    """
+    meta = {
+        "views": get_views(doctype),
+        "quick_filters": get_quick_filters(doctype),
+        "filterable_fields": get_filterable_fields(doctype),
+        "sort_options": sort_options(doctype),
+        "group_by_fields": get_group_by_fields(doctype),
+        "form_script": get_form_script(doctype),
+        "list_script": get_form_script(doctype, "List"),
+    }
+
+    current_hash = hashlib.sha256(frappe.as_json(meta).encode()).hexdigest()
+    if content_hash == current_hash:
+        return {"content_hash": current_hash, "not_modified": True}
+
+    meta["content_hash"] = current_hash
+    meta["not_modified"] = False
+    return meta
+
+
 @frappe.whitelist()
 def update_quick_filters(quick_filters: str, old_filters: str, doctype: str):
     quick_filters = json.loads(quick_filters)
@@ -254,9 +341,17 @@ def get_data(
     kanban_fields=None,
     view=None,
     default_filters=None,
+    estimate_count=False,
+    cursor=None,
+    start=0,
+    etag=None,
+    compact=False,
 ):
-    custom_view = False
-    filters = frappe._dict(filters)
+    estimate_count = cint(estimate_count)
+    compact = cint(compact)
+    cursor = frappe.parse_json(cursor) if cursor else None
+    next_cursor = None
+    filters = get_list_filters(doctype, filters, default_filters)
     rows = frappe.parse_json(rows or "[]")
     columns = frappe.parse_json(columns or "[]")
     kanban_fields = frappe.parse_json(kanban_fields or "[]")
@@ -266,62 +361,30 @@ def get_data(
     view_type = view.get("view_type") if view else None
     group_by_field = view.get("group_by_field") if view else None
 
-    for key in filters:
-        value = filters[key]
-        if isinstance(value, list):
-            if "@me" in value:
-                value[value.index("@me")] = frappe.session.user
-            elif "%@me%" in value:
-                index = [i for i, v in enumerate(value) if v == "%@me%"]
-                for i in index:
-                    value[i] = "%" + frappe.session.user + "%"
-        elif value == "@me":
-            filters[key] = frappe.session.user
-
-    if default_filters:
-        default_filters = frappe.parse_json(default_filters)
-        filters.update(default_filters)
-
-    if doctype == "Report":
-        has_roles = frappe.get_all(
-            "Has Role",
-            filters={"role": ["in", ["Sales User", "Sales Manager"]]},
-            fields=["parent"],
-            pluck="parent",
-        )
-        filters["name"] = ["in", has_roles]
-        if not filters.get("disabled"):
-            filters["disabled"] = 0
-
-    if doctype == "ToDo":
-        session_user = frappe.session.user
-        sales_team_roles = ["Sales User", "Sales Manager", "Sales Master Manager"]
-        sales_team_members = frappe.get_all(
-            "Has Role",
-            filters={"role": ["in", sales_team_roles]},
-            fields=["parent"],
-            pluck="parent",
-        )
-        if session_user in sales_team_members:
-            if not filters.get("allocated_to", None):
-                filters["allocated_to"] = ["in", sales_team_members]
-            else:
-                if isinstance(filters.get("allocated_to"), list):
-                    if filters.get("allocated_to")[0] == "in":
-                        allocated_to_list = filters.get("allocated_to")[1]
-                        allocated_to_list = list(
-                            set(allocated_to_list) & set(sales_team_members)
-                        )
-                        filters["allocated_to"] = ["in", allocated_to_list]
-                elif filters.get("allocated_to") not in sales_team_members:
-                    filters["allocated_to"] = ["=", session_user]
-        else:
-            filters["allocated_to"] = ["=", session_user]
-        if not filters.get("reference_type", None):
-            filters["reference_type"] = [
-                "in",
-                ["Lead", "Opportunity", "Customer", "Task"],
-            ]
+    list_summary = get_list_summary(doctype, filters)
+    data_etag = get_data_etag(
+        doctype,
+        filters,
+        {
+            "order_by": order_by,
+            "page_length": page_length,
+            "page_length_count": page_length_count,
+            "column_field": column_field,
+            "title_field": title_field,
+            "columns": columns,
+            "rows": rows,
+            "kanban_columns": kanban_columns,
+            "kanban_fields": kanban_fields,
+            "view": view,
+            "estimate_count": estimate_count,
+            "compact": compact,
+            "cursor": cursor,
+            "start": start,
+        },
+        list_summary,
+    )
+    if etag and etag == data_etag:
+        return {"etag": data_etag, "not_modified": True}
 
     is_default = True
     data = []
@@ -331,81 +394,22 @@ def get_data(
         default_rows = _list.default_list_data().get("rows")
 
     if view_type != "kanban":
-        if columns or rows:
-            custom_view = True
-            is_default = False
-            columns = frappe.parse_json(columns)
-            rows = frappe.parse_json(rows)
-
-        if not columns:
-            columns = [
-                {"label": "Name", "type": "Data", "key": "name", "width": "16rem"},
-                {
-                    "label": "Last Modified",
-                    "type": "Datetime",
-                    "key": "modified",
-                    "width": "8rem",
-                },
-            ]
-
-        if not rows:
-            rows = ["name"]
-
-        default_view_filters = {
-            "dt": doctype,
-            "type": view_type or "list",
-            "is_default": 1,
-            "user": frappe.session.user,
-        }
-
-        if not custom_view and frappe.db.exists(
-            "CRM View Settings", default_view_filters
-        ):
-            list_view_settings = frappe.get_doc(
-                "CRM View Settings", default_view_filters
-            )
-            columns = frappe.parse_json(list_view_settings.columns)
-            rows = frappe.parse_json(list_view_settings.rows)
-            is_default = False
-        elif not custom_view or (is_default and hasattr(_list, "default_list_data")):
-            rows = default_rows
-            columns = _list.default_list_data().get("columns")
-
-        # check if rows has all keys from columns if not add them
-        for column in columns:
-            if column.get("key") not in rows:
-                rows.append(column.get("key"))
-            column["label"] = _(column.get("label"))
-
-            if column.get("key") == "_liked_by" and column.get("width") == "10rem":
-                column["width"] = "50px"
-
-        # check if rows has group_by_field if not add it
-        if group_by_field and group_by_field not in rows:
-            rows.append(group_by_field)
+        columns, rows, is_default = get_list_columns(
+            doctype, columns, rows, view_type, group_by_field
+        )
 
-        if doctype == "ToDo":
-            data = (
-                frappe.get_all(
-                    doctype,
-                    fields=rows,
-                    filters=filters,
-                    order_by=order_by,
-                    page_length=page_length,
-                )
-                or []
-            )
-        else:
-            data = (
-                frappe.get_list(
-                    doctype,
-                    fields=rows,
-                    filters=filters,
-                    order_by=order_by,
-                    page_length=page_length,
-                )
-                or []
-            )
+        # with a cursor only the page after the cursor row is read, falling
+        # back to an offset when the sort order can't be used as a cursor
+        data, next_cursor = get_page(
+            doctype,
+            rows,
+            filters,
+            order_by,
+            page_length,
+            cursor=cursor,
+            start=cint(start),
+            ignore_permissions=doctype == "ToDo",
+        )
 
     if view_type == "kanban":
         if not rows:
@@ -443,6 +447,11 @@ def get_data(
             if field not in rows:
                 rows.append(field)
 
+        if has_engagement_count_fields(doctype):
+            for field in ENGAGEMENT_COUNT_FIELDS.values():
+                if field not in rows:
+                    rows.append(field)
+
         enabled_columns = []
         cf_in_filter = True
         if (
@@ -459,121 +468,80 @@ def get_data(
             cf_in_filter = False
             enabled_columns = kanban_columns
 
-        for kc in enabled_columns:
-            column_filters = {column_field: kc.get("name")}
-            order = kc.get("order")
+        if cf_in_filter:
+            filters.pop(column_field, None)
 
-            if (
+        if "custom_priority" not in rows:
+            rows.append("custom_priority")
+
+        active_columns = [
+            kc
+            for kc in enabled_columns
+            if not kc.get("delete")
+            and not (
                 column_field in filters
                 and filters.get(column_field) != kc.get("name")
                 and not cf_in_filter
-            ) or kc.get("delete"):
-                column_data = []
-            else:
-                if cf_in_filter:
-                    filters.pop(column_field, None)
-                column_filters.update(filters.copy())
-
-                page_length = 20
-
-                if kc.get("page_length"):
-                    page_length = kc.get("page_length")
-
-                if order:
-                    if "custom_priority" not in rows:
-                        rows.append("custom_priority")
-                    column_data = get_records_based_on_order(
-                        doctype, rows, column_filters, page_length, order
-                    )
-                else:
-                    if "custom_priority" not in rows:
-                        rows.append("custom_priority")
-                    column_data = frappe.get_list(
-                        doctype,
-                        fields=rows,
-                        filters=convert_filter_to_tuple(doctype, column_filters),
-                        order_by=order_by,
-                        page_length=page_length,
-                    )
+            )
+        ]
+        active_column_names = [kc.get("name") for kc in active_columns]
 
-                new_filters = filters.copy()
-                new_filters.update({column_field: kc.get("name")})
+        # rows and counts of all columns are fetched at once
+        kanban_data = get_kanban_column_data(
+            doctype,
+            rows,
+            filters,
+            order_by,
+            column_field,
+            active_columns,
+            view=custom_view_name,
+        )
+        kanban_counts = get_kanban_column_counts(
+            doctype,
+            filters,
+            column_field,
+            active_column_names,
+            estimate=estimate_count,
+        )
 
-                all_count = len(
-                    frappe.get_list(
-                        doctype, filters=convert_filter_to_tuple(doctype, new_filters)
-                    )
-                )
+        for kc in enabled_columns:
+            kc.pop("order", None)
 
-                kc["all_count"] = all_count
+            if kc.get("name") not in active_column_names:
+                column_data = []
+            else:
+                column_data = kanban_data.get(kc.get("name"), [])
+                kc["all_count"] = kanban_counts.get(kc.get("name"), 0)
                 kc["count"] = len(column_data)
 
-                for d in column_data:
-                    getCounts(d, doctype)
-
-            if order:
-                column_data = sorted(
-                    column_data,
-                    key=lambda x: (
-                        order.index(x.get("name"))
-                        if x.get("name") in order
-                        else len(order)
-                    ),
-                )
-
             data.append({"column": kc, "fields": kanban_fields, "data": column_data})
 
-    fields = frappe.get_meta(doctype).fields
-    fields = [field for field in fields if field.fieldtype not in no_value_fields]
-    fields = [
-        {
-            "label": _(field.label),
-            "type": field.fieldtype,
-            "value": field.fieldname,
-            "options": field.options,
-        }
-        for field in fields
-        if field.label and field.fieldname
-    ]
-
-    std_fields = [
-        {"label": "Name", "type": "Data", "value": "name"},
-        {"label": "Created On", "type": "Datetime", "value": "creation"},
-        {"label": "Last Modified", "type": "Datetime", "value": "modified"},
-        {
-            "label": "Modified By",
-            "type": "Link",
-            "value": "modified_by",
-            "options": "User",
-        },
-        {"label": "Assigned To", "type": "Text", "value": "_assign"},
-        {"label": "Owner", "type": "Link", "value": "owner", "options": "User"},
-        {"label": "Like", "type": "Data", "value": "_liked_by"},
-    ]
+        set_engagement_counts(
+            [d for column in data for d in column.get("data")], doctype
+        )
 
-    for field in std_fields:
-        if field.get("value") not in rows:
-            rows.append(field.get("value"))
-        if field not in fields:
-            field["label"] = _(field["label"])
-            fields.append(field)
+    fields = get_cached_field_projection(doctype, "data_fields", build_data_fields)
+    for field in fields:
+        field["label"] = _(field["label"])
+        if field.get("value") in STANDARD_DATA_FIELDS and field["value"] not in rows:
+            rows.append(field["value"])
 
     if not is_default and custom_view_name:
-        is_default = frappe.db.get_value(
-            "CRM View Settings", custom_view_name, "load_default_columns"
+        custom_view_settings = get_compiled_view(doctype, view_name=custom_view_name)
+        is_default = (
+            custom_view_settings.load_default_columns if custom_view_settings else None
         )
 
     if group_by_field and view_type == "group_by":
 
+        group_counts = get_group_by_counts(doctype, filters, group_by_field)
+
         def get_options(type, options):
             if type == "Select":
                 return [option for option in options.split("\n")]
             else:
-                has_empty_values = any([not d.get(group_by_field) for d in data])
-                options = list({d.get(group_by_field) for d in data})
-                options = [u for u in options if u]
-                if has_empty_values:
-                    options.append("")
+                options = [d["value"] for d in group_counts if d["value"] != ""]
+                has_empty_values = len(options) != len(group_counts)
 
                 if order_by and group_by_field in order_by:
                     order_by_fields = order_by.split(",")
@@ -587,6 +555,9 @@ def get_data(
                         options.sort(reverse=True)
                 else:
                     options.sort()
+
+                if has_empty_values:
+                    options.append("")
                 return options
 
         for field in fields:
@@ -596,6 +567,7 @@ def get_data(
                     "name": field.get("value"),
                     "type": field.get("type"),
                     "options": get_options(field.get("type"), field.get("options")),
+                    "counts": group_counts,
                 }
 
     # Explicitly adding "Link Type" to Link fields if empty
@@ -606,8 +578,24 @@ def get_data(
         if key in field_map:
             column["type"] = field_map[key]["type"]
 
+    # the client already holds the total while paginating with a cursor, the
+    # records were counted for the ETag already, exactly
+    total_count = None
+    if not cursor:
+        total_count = cint(list_summary.count)
+
+    # counted before encoding, a compact page is a dict of fields and values
+    row_count = len(data)
+
+    if compact and view_type == "kanban":
+        for column in data:
+            column["data"] = encode_records(column["data"])
+    elif compact:
+        data = encode_records(data)
+
     return {
         "data": data,
+        "compact": bool(compact),
         "columns": columns,
         "rows": rows,
         "fields": fields,
@@ -620,53 +608,1015 @@ def get_data(
         "page_length_count": page_length_count,
         "is_default": is_default,
         "views": get_views(doctype),
-        "total_count": len(frappe.get_list(doctype, filters=filters)),
-        "row_count": len(data),
+        "total_count": total_count,
+        "total_count_estimated": False,
+        "next_cursor": next_cursor,
+        "row_count": row_count,
+        "etag": data_etag,
+        "delta_version": get_delta_version(doctype, list_summary),
         "form_script": get_form_script(doctype),
         "list_script": get_form_script(doctype, "List"),
         "view_type": view_type,
     }
 
 
-def convert_filter_to_tuple(doctype, filters):
-    if isinstance(filters, dict):
-        filters_items = filters.items()
-        filters = []
-        for key, value in filters_items:
-            filters.append(make_filter_tuple(doctype, key, value))
-    return filters
+STANDARD_DATA_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "modified_by",
+    "_assign",
+    "owner",
+    "_liked_by",
+)
+
+
+def build_data_fields(doctype):
+    fields = frappe.get_meta(doctype).fields
+    fields = [field for field in fields if field.fieldtype not in no_value_fields]
+    fields = [
+        {
+            "label": field.label,
+            "type": field.fieldtype,
+            "value": field.fieldname,
+            "options": field.options,
+        }
+        for field in fields
+        if field.label and field.fieldname
+    ]
+
+    std_fields = [
+        {"label": "Name", "type": "Data", "value": "name"},
+        {"label": "Created On", "type": "Datetime", "value": "creation"},
+        {"label": "Last Modified", "type": "Datetime", "value": "modified"},
+        {
+            "label": "Modified By",
+            "type": "Link",
+            "value": "modified_by",
+            "options": "User",
+        },
+        {"label": "Assigned To", "type": "Text", "value": "_assign"},
+        {"label": "Owner", "type": "Link", "value": "owner", "options": "User"},
+        {"label": "Like", "type": "Data", "value": "_liked_by"},
+    ]
+
+    return fields + std_fields
+
+
+@frappe.whitelist()
+def export_data(
+    doctype: str,
+    filters=None,
+    order_by=None,
+    columns=None,
+    rows=None,
+    view=None,
+    default_filters=None,
+    file_format="CSV",
+):
+    """
+    Streams every record of a list view as CSV or NDJSON. Filters and columns
+    are resolved like `get_data`, records are read `EXPORT_CHUNK_SIZE` at a
+    time so memory use doesn't grow with the number of records.
+    """
+    if file_format not in ("CSV", "NDJSON"):
+        frappe.throw(_("Invalid file format {0}").format(file_format))
+
+    if not frappe.has_permission(doctype, "export"):
+        frappe.throw(
+            _("Not permitted to export {0}").format(_(doctype)),
+            frappe.PermissionError,
+        )
+
+    view = frappe.parse_json(view) if view else None
+    filters = get_list_filters(doctype, filters, default_filters)
+
+    view_type = view.get("view_type") if view else None
+    if view_type == "kanban":
+        view_type = "list"
+    group_by_field = view.get("group_by_field") if view else None
+
+    columns, rows, _is_default = get_list_columns(
+        doctype,
+        frappe.parse_json(columns or "[]"),
+        frappe.parse_json(rows or "[]"),
+        view_type,
+        group_by_field,
+    )
+    keys = [column.get("key") for column in columns]
+
+    def encode(row):
+        if file_format == "CSV":
+            return get_csv_line([row.get(key) for key in keys])
+        record = {key: row.get(key) for key in keys}
+        return frappe.as_json(record, indent=None, separators=(",", ":")) + "\n"
+
+    def generate(site, user):
+        # the response body is read after the request is torn down, so the
+        # records are read in a context of their own
+        frappe.init(site=site)
+        frappe.connect(set_admin_as_user=False)
+        frappe.set_user(user)
+        try:
+            if file_format == "CSV":
+                yield get_csv_line([column.get("label") for column in columns])
+
+            cursor, start = None, 0
+            while True:
+                data, cursor = get_page(
+                    doctype,
+                    rows,
+                    filters,
+                    order_by,
+                    EXPORT_CHUNK_SIZE,
+                    cursor=cursor,
+                    start=start,
+                    ignore_permissions=doctype == "ToDo",
+                )
+                yield "".join(encode(row) for row in data)
+
+                if len(data) < EXPORT_CHUNK_SIZE:
+                    break
+                start += len(data)
+        finally:
+            frappe.destroy()
+
+    extension = file_format.lower()
+    response = Response(
+        generate(frappe.local.site, frappe.session.user),
+        mimetype="text/csv" if file_format == "CSV" else "application/x-ndjson",
+        direct_passthrough=True,
+    )
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{doctype}.{extension}"'
+    )
+    return response
+
+
+@frappe.whitelist()
+def get_data_delta(
+    doctype: str,
+    since: str,
+    filters=None,
+    order_by=None,
+    columns=None,
+    rows=None,
+    view=None,
+    default_filters=None,
+    names=None,
+    delta_version=None,
+):
+    """
+    Returns the records of a list view added or modified after `since`, and
+    which of the `names` held by the client no longer match the view, deleted
+    records included, so an open list can be refreshed with only its changes.
+
+    Assignments, likes, tags and engagement counters are written without
+    updating `modified`, so `since` can't find them. Pass the `delta_version`
+    of the previous response, or of `get_data`; `reload` is set if it moved
+    since, as it is if more than `DELTA_ROW_LIMIT` records changed, and the
+    client should fetch the list again instead.
+    """
+    view = frappe.parse_json(view) if view else None
+    names = frappe.parse_json(names or "[]")
+    filters = get_list_filters(doctype, filters, default_filters)
 
+    view_type = view.get("view_type") if view else None
+    if view_type == "kanban":
+        view_type = "list"
+    group_by_field = view.get("group_by_field") if view else None
 
-def get_records_based_on_order(doctype, rows, filters, page_length, order):
-    records = []
+    _columns, rows, _is_default = get_list_columns(
+        doctype,
+        frappe.parse_json(columns or "[]"),
+        frappe.parse_json(rows or "[]"),
+        view_type,
+        group_by_field,
+    )
+    rows = list(dict.fromkeys([*rows, "name", "modified"]))
     filters = convert_filter_to_tuple(doctype, filters)
-    in_filters = filters.copy()
-    in_filters.append([doctype, "name", "in", order[:page_length]])
-    records = frappe.get_list(
+    list_method = get_list_method(doctype)
+
+    current_version = get_delta_version(doctype, get_list_summary(doctype, filters))
+    if delta_version and delta_version != current_version:
+        return {
+            "reload": True,
+            "data": [],
+            "removed": [],
+            "watermark": since,
+            "delta_version": current_version,
+        }
+
+    data = list_method(
         doctype,
         fields=rows,
-        filters=in_filters,
-        order_by="creation desc",
-        page_length=page_length,
+        filters=[*filters, [doctype, "modified", ">", since]],
+        order_by=order_by or "modified desc",
+        page_length=DELTA_ROW_LIMIT + 1,
     )
+    if len(data) > DELTA_ROW_LIMIT:
+        return {
+            "reload": True,
+            "data": [],
+            "removed": [],
+            "watermark": since,
+            "delta_version": current_version,
+        }
 
-    if len(records) < page_length:
-        not_in_filters = filters.copy()
-        not_in_filters.append([doctype, "name", "not in", order])
-        remaining_records = frappe.get_list(
+    removed = []
+    if names:
+        matching = list_method(
             doctype,
-            fields=rows,
-            filters=not_in_filters,
-            order_by="creation desc",
-            page_length=page_length - len(records),
+            filters=[*filters, [doctype, "name", "in", names]],
+            pluck="name",
+            order_by=None,
+            page_length=len(names),
         )
-        for record in remaining_records:
-            records.append(record)
+        matching = set(matching)
+        removed = [name for name in names if name not in matching]
 
-    return records
+    watermark = max([get_datetime(since), *[d.modified for d in data]])
+    return {
+        "reload": False,
+        "data": data,
+        "removed": removed,
+        "watermark": str(watermark),
+        "delta_version": current_version,
+    }
 
 
-def get_available_kanban_column_options(doctype, column_field):
+def get_list_summary(doctype, filters):
+    """Returns the count, last `modified` and total tags length of the records matching `filters`"""
+    return get_list_method(doctype)(
+        doctype,
+        fields=[
+            f"count(`tab{doctype}`.`name`) as count",
+            f"max(`tab{doctype}`.`modified`) as modified",
+            f"sum(length(`tab{doctype}`.`_user_tags`)) as tags_length",
+        ],
+        filters=filters,
+        order_by=None,
+    )[0]
+
+
+def get_delta_version(doctype, list_summary):
+    """
+    Returns a token of the writes to the records of `list_summary` that keep
+    `modified`, see `get_data_etag`: the list version and the tags length.
+    """
+    return f"{get_list_version(doctype) or ''}:{cint(list_summary.tags_length)}"
+
+
+def get_data_etag(doctype, filters, args, list_summary=None):
+    """
+    Returns a fingerprint of the result of `get_data` for `filters` and the
+    other request `args`. It changes whenever a matching record is added,
+    modified, placed on a kanban board or removed, or the fields, views or
+    scripts of `doctype` change.
+
+    Assignments, likes, tags and engagement counters are written without
+    updating `modified`. All but tags are tracked by `bump_list_version`,
+    tags, which are removed without running any hook, by their total length.
+    """
+    result = list_summary or get_list_summary(doctype, filters)
+
+    view = args.get("view") or {}
+    ranks = None
+    if view.get("view_type") == "kanban":
+        ranks = frappe.get_all(
+            "CRM Kanban Rank",
+            filters={
+                "reference_doctype": doctype,
+                "view": get_rank_view(view.get("custom_view_name")),
+            },
+            fields=["count(name) as count", "max(modified) as modified"],
+        )
+
+    fingerprint = [
+        frappe.session.user,
+        frappe.local.lang,
+        filters,
+        args,
+        cint(result.count),
+        result.modified,
+        cint(result.tags_length),
+        get_list_version(doctype),
+        frappe.get_meta(doctype).modified,
+        [(view.name, view.modified) for view in get_views(doctype)],
+        get_form_script_hash(doctype),
+        get_form_script_hash(doctype, "List"),
+        ranks,
+    ]
+    return hashlib.sha256(frappe.as_json(fingerprint).encode()).hexdigest()
+
+
+def get_list_version(doctype):
+    return frappe.cache.hget(LIST_VERSION_CACHE_KEY, doctype)
+
+
+def bump_list_version(doctype):
+    """
+    Changes the list version of `doctype` once the transaction commits, so
+    list ETags change after writes that keep `modified`, see `get_data_etag`.
+    """
+    frappe.db.after_commit.add(
+        lambda: frappe.cache.hset(
+            LIST_VERSION_CACHE_KEY, doctype, frappe.generate_hash(length=10)
+        )
+    )
+
+
+def encode_records(records):
+    """
+    Returns `records` as the list of their fields and one array of values per
+    record, so keys are sent once instead of on every record.
+    """
+    fields = list(dict.fromkeys(key for record in records for key in record))
+    return {
+        "fields": fields,
+        "values": [[record.get(field) for field in fields] for record in records],
+    }
+
+
+def get_csv_line(values):
+    """Returns `values` as one CSV line"""
+    out = io.StringIO()
+    csv.writer(out).writerow(["" if value is None else value for value in values])
+    return out.getvalue()
+
+
+def set_doctype_filters(doctype, filters):
+    """Restricts `filters` to the records of `doctype` the CRM lists"""
+    if doctype == "Report":
+        filters["name"] = [
+            "in",
+            sorted(get_role_holders("Report", ["Sales User", "Sales Manager"])),
+        ]
+        if not filters.get("disabled"):
+            filters["disabled"] = 0
+
+    if doctype == "ToDo":
+        session_user = frappe.session.user
+        sales_team_members = get_sales_team_members()
+        if session_user in sales_team_members:
+            if not filters.get("allocated_to", None):
+                filters["allocated_to"] = ["in", sorted(sales_team_members)]
+            else:
+                if isinstance(filters.get("allocated_to"), list):
+                    if filters.get("allocated_to")[0] == "in":
+                        allocated_to_list = filters.get("allocated_to")[1]
+                        allocated_to_list = sorted(
+                            set(allocated_to_list) & sales_team_members
+                        )
+                        filters["allocated_to"] = ["in", allocated_to_list]
+                elif filters.get("allocated_to") not in sales_team_members:
+                    filters["allocated_to"] = ["=", session_user]
+        else:
+            filters["allocated_to"] = ["=", session_user]
+        if not filters.get("reference_type", None):
+            filters["reference_type"] = [
+                "in",
+                ["Lead", "Opportunity", "Customer", "Task"],
+            ]
+
+
+def get_list_filters(doctype, filters, default_filters=None):
+    """Returns the filters of a CRM list of `doctype`, as used by `get_data`"""
+    filters = parse_filters(filters, default_filters, doctype)
+    set_doctype_filters(doctype, filters)
+    return filters
+
+
+def get_list_method(doctype):
+    """
+    Returns the method the CRM lists read `doctype` with. ToDos are already
+    restricted to the sales team by `set_doctype_filters`.
+    """
+    return frappe.get_all if doctype == "ToDo" else frappe.get_list
+
+
+def get_list_columns(doctype, columns, rows, view_type=None, group_by_field=None):
+    """
+    Returns the columns, the fields to read and whether the default view is
+    used for a list or group by view of `doctype`.
+    """
+    custom_view = False
+    is_default = True
+    _list = get_controller(doctype)
+    default_rows = []
+    if hasattr(_list, "default_list_data"):
+        default_rows = _list.default_list_data().get("rows")
+
+    if columns or rows:
+        custom_view = True
+        is_default = False
+        columns = frappe.parse_json(columns)
+        rows = frappe.parse_json(rows)
+
+    if not columns:
+        columns = [
+            {"label": "Name", "type": "Data", "key": "name", "width": "16rem"},
+            {
+                "label": "Last Modified",
+                "type": "Datetime",
+                "key": "modified",
+                "width": "8rem",
+            },
+        ]
+
+    if not rows:
+        rows = ["name"]
+
+    default_view = None
+    if not custom_view:
+        default_view = get_compiled_view(doctype, view_type or "list")
+
+    if default_view:
+        columns = default_view.columns
+        rows = default_view.rows
+        is_default = False
+    elif not custom_view or (is_default and hasattr(_list, "default_list_data")):
+        rows = default_rows
+        columns = _list.default_list_data().get("columns")
+
+    # check if rows has all keys from columns if not add them
+    for column in columns:
+        if column.get("key") not in rows:
+            rows.append(column.get("key"))
+        column["label"] = _(column.get("label"))
+
+        if column.get("key") == "_liked_by" and column.get("width") == "10rem":
+            column["width"] = "50px"
+
+    # check if rows has group_by_field if not add it
+    if group_by_field and group_by_field not in rows:
+        rows.append(group_by_field)
+
+    return columns, rows, is_default
+
+
+def parse_filters(filters, default_filters=None, doctype=None):
+    """
+    Returns `filters` with `@me` resolved to the session user and
+    `default_filters` applied. With `doctype`, filters on assignments and
+    likes use the assignment index, see `use_assignment_index`.
+    """
+    filters = frappe._dict(frappe.parse_json(filters) or {})
+
+    for key in filters:
+        value = filters[key]
+        if isinstance(value, list):
+            if "@me" in value:
+                value[value.index("@me")] = frappe.session.user
+            elif "%@me%" in value:
+                index = [i for i, v in enumerate(value) if v == "%@me%"]
+                for i in index:
+                    value[i] = "%" + frappe.session.user + "%"
+        elif value == "@me":
+            filters[key] = frappe.session.user
+
+    if default_filters:
+        default_filters = frappe.parse_json(default_filters)
+        filters.update(default_filters)
+
+    if doctype:
+        use_assignment_index(doctype, filters)
+
+    return filters
+
+
+def use_assignment_index(doctype, filters):
+    """
+    Rewrites `like %user%` filters on `_assign` and `_liked_by`, which scan
+    the whole table, into a `name` filter on the records found in the CRM
+    Assignment Index.
+
+    Only whole users (`@me` or the id of a user) are looked up, other values
+    may be a part of a user and keep their filter. So do users with more than
+    `INDEX_LOOKUP_LIMIT` records, whose names would make a larger query than
+    the scan. Only the doctypes in `LIST_VIEW_DOCTYPES` are indexed.
+    """
+    if doctype not in LIST_VIEW_DOCTYPES or "name" in filters or not is_index_built():
+        return filters
+
+    include, exclude = None, set()
+    for column in INDEXED_COLUMNS:
+        value = filters.get(column)
+        if not (isinstance(value, list) and len(value) == 2):
+            continue
+
+        operator, pattern = str(value[0]).lower(), value[1]
+        if (
+            operator not in ("like", "not like")
+            or not isinstance(pattern, str)
+            or len(pattern) < 3
+            or not (pattern.startswith("%") and pattern.endswith("%"))
+            or not is_user_id(pattern[1:-1])
+        ):
+            continue
+
+        names = get_indexed_names(
+            doctype, column, pattern[1:-1], limit=INDEX_LOOKUP_LIMIT + 1
+        )
+        if len(names) > INDEX_LOOKUP_LIMIT:
+            continue
+
+        if operator == "like":
+            include = set(names) if include is None else include & set(names)
+        else:
+            exclude |= set(names)
+        del filters[column]
+
+    if include is not None:
+        filters["name"] = ["in", sorted(include - exclude)]
+    elif exclude:
+        filters["name"] = ["not in", sorted(exclude)]
+
+    return filters
+
+
+def is_user_id(value):
+    return bool(frappe.db.exists("User", value))
+
+
+@frappe.whitelist()
+def get_kanban_column(
+    doctype: str,
+    column_field: str,
+    column,
+    filters=None,
+    order_by=None,
+    rows=None,
+    default_filters=None,
+    cursor=None,
+    start=0,
+    page_length=20,
+    view=None,
+):
+    """
+    Returns the next page of cards of a single kanban column, with their
+    engagement counts, without touching the other columns of the board.
+
+    `column` is the kanban column as returned by `get_data` and `view` the
+    name of the saved view, if any. Pass `cursor` (the `next_cursor` of the
+    previous page) or `start` (the number of cards already loaded) to get the
+    following page. Columns with cards placed by hand only page by `start`.
+    """
+    validate_column_field(doctype, column_field)
+
+    column = frappe._dict(frappe.parse_json(column))
+    cursor = frappe.parse_json(cursor) if cursor else None
+    page_length = cint(page_length) or 20
+    filters = get_list_filters(doctype, filters, default_filters)
+    rows = frappe.parse_json(rows or "[]")
+
+    if not rows:
+        _list = get_controller(doctype)
+        if hasattr(_list, "default_list_data"):
+            rows = _list.default_list_data().get("rows")
+    rows = list(dict.fromkeys([*rows, "name", "custom_priority"]))
+
+    if has_engagement_count_fields(doctype):
+        rows = list(dict.fromkeys([*rows, *ENGAGEMENT_COUNT_FIELDS.values()]))
+
+    filters[column_field] = column.name
+    next_cursor = None
+
+    if has_ranked_cards(doctype, view, column.name):
+        column.update({"page_length": page_length, "start": cint(start)})
+        data = get_kanban_column_data(
+            doctype,
+            rows,
+            filters,
+            order_by,
+            column_field,
+            [column],
+            view=view,
+        ).get(column.name, [])
+    else:
+        data, next_cursor = get_page(
+            doctype,
+            rows,
+            filters,
+            order_by,
+            page_length,
+            cursor=cursor,
+            start=cint(start),
+            ignore_permissions=doctype == "ToDo",
+        )
+
+    set_engagement_counts(data, doctype)
+
+    return {
+        "column": column.name,
+        "data": data,
+        "count": len(data),
+        "next_cursor": next_cursor,
+    }
+
+
+@frappe.whitelist()
+def get_group_by_data(
+    doctype: str,
+    group_by_field: str,
+    group_value=None,
+    filters=None,
+    order_by=None,
+    rows=None,
+    default_filters=None,
+    cursor=None,
+    start=0,
+    page_length=20,
+):
+    """
+    Returns a page of the records of a single group of a group by view, so
+    groups can be loaded lazily. Use an empty `group_value` for the records
+    without a value.
+    """
+    validate_column_field(doctype, group_by_field)
+
+    cursor = frappe.parse_json(cursor) if cursor else None
+    filters = get_list_filters(doctype, filters, default_filters)
+    rows = frappe.parse_json(rows or "[]") or ["name"]
+    rows = list(dict.fromkeys([*rows, "name", group_by_field]))
+
+    # 0 is the value of a Check or Int group, only None and "" are not set
+    if group_value in (None, ""):
+        filters[group_by_field] = ["is", "not set"]
+    else:
+        filters[group_by_field] = group_value
+
+    data, next_cursor = get_page(
+        doctype,
+        rows,
+        filters,
+        order_by,
+        cint(page_length) or 20,
+        cursor=cursor,
+        start=cint(start),
+        ignore_permissions=doctype == "ToDo",
+    )
+
+    return {
+        "group_value": "" if group_value is None else group_value,
+        "data": data,
+        "count": len(data),
+        "next_cursor": next_cursor,
+    }
+
+
+def get_group_by_counts(doctype, filters, group_by_field):
+    """
+    Returns `[{"value": ..., "count": ...}]` for every value of `group_by_field`
+    among the filtered records using one GROUP BY query. Empty and null values
+    are counted together under `""`.
+    """
+    validate_column_field(doctype, group_by_field)
+
+    counts = get_list_method(doctype)(
+        doctype,
+        fields=[
+            f"`tab{doctype}`.`{group_by_field}` as group_value",
+            f"count(`tab{doctype}`.`name`) as count",
+        ],
+        filters=filters,
+        group_by=f"`tab{doctype}`.`{group_by_field}`",
+        order_by=None,
+    )
+
+    groups = {}
+    for d in counts:
+        value = d.group_value if d.group_value not in (None, "") else ""
+        groups[value] = groups.get(value, 0) + cint(d.count)
+
+    return [{"value": value, "count": count} for value, count in groups.items()]
+
+
+def get_page(
+    doctype,
+    fields,
+    filters,
+    order_by,
+    page_length,
+    cursor=None,
+    start=0,
+    ignore_permissions=False,
+):
+    """
+    Returns a page of `doctype` records and the cursor of the next page.
+
+    The page is read after `cursor` when the sort order can be used as a
+    cursor, see `get_keyset_args`, and from the `start` offset otherwise.
+    """
+    list_args = {
+        "fields": fields,
+        "filters": filters,
+        "order_by": order_by,
+        "page_length": page_length,
+    }
+
+    keyset_sort_key = get_keyset_sort_key(doctype, order_by)
+    if keyset_sort_key:
+        list_args["fields"] = list(dict.fromkeys([*fields, "name", keyset_sort_key[0]]))
+        list_args["order_by"] = get_keyset_order_by(doctype, keyset_sort_key)
+
+    if keyset_sort_key and cursor:
+        list_args.update(get_keyset_args(doctype, filters, keyset_sort_key, cursor))
+    else:
+        list_args["start"] = start
+
+    if ignore_permissions:
+        data = frappe.get_all(doctype, **list_args) or []
+    else:
+        data = frappe.get_list(doctype, **list_args) or []
+
+    next_cursor = None
+    if keyset_sort_key and data:
+        next_cursor = {
+            "value": data[-1].get(keyset_sort_key[0]),
+            "name": data[-1].get("name"),
+        }
+
+    return data, next_cursor
+
+
+def convert_filter_to_tuple(doctype, filters):
+    if isinstance(filters, dict):
+        filters_items = filters.items()
+        filters = []
+        for key, value in filters_items:
+            filters.append(make_filter_tuple(doctype, key, value))
+    return filters
+
+
+def get_valid_columns(doctype):
+    """Returns the database columns of `doctype` that can be used in raw SQL"""
+    return frappe.get_meta(doctype).get_valid_columns() + list(optional_fields)
+
+
+def parse_order_by(doctype, order_by):
+    """
+    Split an `order_by` clause into `(fieldname, direction)` pairs. Only plain
+    columns of `doctype` are kept so the result is safe to use in raw SQL.
+    """
+    valid_columns = get_valid_columns(doctype)
+    sort_keys = []
+
+    for part in (order_by or "").split(","):
+        tokens = part.strip().split()
+        if not tokens:
+            continue
+
+        fieldname = tokens[0].replace("`", "").split(".")[-1]
+        direction = tokens[1].lower() if len(tokens) > 1 else "asc"
+        if fieldname in valid_columns and direction in ("asc", "desc"):
+            sort_keys.append((fieldname, direction))
+
+    return sort_keys
+
+
+def validate_column_field(doctype, fieldname):
+    if fieldname not in get_valid_columns(doctype):
+        frappe.throw(_("Invalid field {0}").format(fieldname), frappe.ValidationError)
+
+
+# sort columns that are never null, so they can be compared against a cursor
+KEYSET_SORT_FIELDS = ("name", "creation", "modified")
+
+
+def get_keyset_sort_key(doctype, order_by):
+    """
+    Returns the `(fieldname, direction)` used for cursor pagination of
+    `order_by`, or None if its first sort column can't be used as a cursor.
+    """
+    sort_keys = parse_order_by(doctype, order_by) or [("modified", "desc")]
+    if sort_keys[0][0] not in KEYSET_SORT_FIELDS:
+        return None
+    if len(sort_keys) > 1 and sort_keys[1][0] != "name":
+        return None
+    return sort_keys[0]
+
+
+def get_keyset_order_by(doctype, sort_key):
+    """Returns the order by clause of `sort_key`, with `name` as tie breaker"""
+    fieldname, direction = sort_key
+    order_by = f"`tab{doctype}`.`{fieldname}` {direction}"
+    if fieldname != "name":
+        order_by += f", `tab{doctype}`.`name` {direction}"
+    return order_by
+
+
+def get_keyset_args(doctype, filters, sort_key, cursor):
+    """
+    Returns the `filters` and `or_filters` that read the page after `cursor`,
+    a `{"value": ..., "name": ...}` map of the last row's sort value and name.
+
+    `col < value or (col = value and name < last_name)` is written as
+    `col <= value and (col < value or name < last_name)` so it fits in filters
+    and can be served by an index on the sort column.
+    """
+    fieldname, direction = sort_key
+    operator = "<" if direction == "desc" else ">"
+
+    args = {}
+    value = cursor.get("value")
+    name = cursor.get("name")
+    keyset_filters = list(convert_filter_to_tuple(doctype, filters))
+
+    if fieldname == "name":
+        keyset_filters.append([doctype, "name", operator, name])
+    else:
+        keyset_filters.append([doctype, fieldname, f"{operator}=", value])
+        args["or_filters"] = [
+            [doctype, fieldname, operator, value],
+            [doctype, "name", operator, name],
+        ]
+
+    args["filters"] = keyset_filters
+    return args
+
+
+def get_kanban_column_data(
+    doctype, fields, filters, order_by, column_field, columns, view=None
+):
+    """
+    Fetch a page of `page_length` records, from `start`, of every kanban column
+    with one query.
+
+    Records are ranked within their column using a `ROW_NUMBER()` window over
+    `column_field`, so the number of queries does not depend on the number of
+    columns. Cards placed by hand in `view` stay below the card they were
+    dropped under, see `CRM Kanban Rank`. Returns a `{column name: records}`
+    map.
+    """
+    if not columns:
+        return {}
+
+    validate_column_field(doctype, column_field)
+
+    sort_keys = parse_order_by(doctype, order_by) or [("modified", "desc")]
+    if "name" not in [fieldname for fieldname, _direction in sort_keys]:
+        sort_keys.append(("name", sort_keys[-1][1]))
+
+    fields = list(
+        dict.fromkeys(
+            [*fields, "name", column_field, *[key for key, _direction in sort_keys]]
+        )
+    )
+
+    column_filters = list(convert_filter_to_tuple(doctype, filters))
+    column_filters.append(
+        [doctype, column_field, "in", [column.get("name") for column in columns]]
+    )
+
+    query = get_list_method(doctype)(
+        doctype,
+        fields=fields,
+        filters=column_filters,
+        order_by=None,
+        run=0,
+    )
+
+    conditions = []
+    values = {}
+    for idx, column in enumerate(columns):
+        conditions.append(
+            f"(r.`{column_field}` = %(column_{idx})s"
+            f" and r._kanban_rank > %(start_{idx})s"
+            f" and r._kanban_rank <= %(end_{idx})s)"
+        )
+        start = cint(column.get("start"))
+        values[f"column_{idx}"] = column.get("name")
+        values[f"start_{idx}"] = start
+        values[f"end_{idx}"] = start + (cint(column.get("page_length")) or 20)
+
+    values["doctype"] = doctype
+    values["view"] = get_rank_view(view)
+    sort_order = ", ".join(
+        f"p.`{fieldname}` {direction}" for fieldname, direction in sort_keys
+    )
+
+    # a card moved by hand follows its anchor, wherever the sort order puts
+    # it, or its own place if the anchor is not listed
+    # escape the generated query as it is formatted again with `values`
+    records = frappe.db.sql(
+        f"""
+        with cards as (
+            select p.*,
+                k.name is not null as _ranked,
+                k.anchor as _anchor,
+                k.position as _position,
+                row_number() over (
+                    partition by p.`{column_field}` order by {sort_order}
+                ) as _sort_index
+            from ({query.replace("%", "%%")}) p
+            left join `tabCRM Kanban Rank` k
+                on k.reference_doctype = %(doctype)s
+                and k.view = %(view)s
+                and k.reference_name = p.name
+                and k.column_name = p.`{column_field}`
+        )
+        select * from (
+            select c.*, row_number() over (
+                partition by c.`{column_field}`
+                order by
+                    case
+                        when not c._ranked then c._sort_index
+                        when coalesce(c._anchor, '') = '' then 0
+                        else coalesce(a._sort_index, c._sort_index)
+                    end,
+                    c._ranked,
+                    c._position,
+                    c._sort_index
+            ) as _kanban_rank
+            from cards c
+            left join cards a
+                on a.name = c._anchor
+                and a.`{column_field}` = c.`{column_field}`
+        ) r
+        where {" or ".join(conditions)}
+        order by r._kanban_rank
+        """,
+        values,
+        as_dict=True,
+    )
+
+    column_data = {column.get("name"): [] for column in columns}
+    for record in records:
+        for key in ("_kanban_rank", "_ranked", "_anchor", "_position", "_sort_index"):
+            record.pop(key, None)
+        column_data.setdefault(record.get(column_field), []).append(record)
+
+    return column_data
+
+
+def has_ranked_cards(doctype, view, column):
+    """Returns whether cards of the kanban `column` were placed by hand in `view`"""
+    return bool(
+        frappe.db.exists(
+            "CRM Kanban Rank",
+            {
+                "reference_doctype": doctype,
+                "view": get_rank_view(view),
+                "column_name": column,
+            },
+        )
+    )
+
+
+def get_kanban_column_counts(
+    doctype, filters, column_field, column_names, estimate=False
+):
+    """
+    Returns a `{column name: count}` map for the kanban columns using one
+    GROUP BY query.
+
+    With `estimate`, each column is counted up to `COUNT_ESTIMATE_CAP` rows
+    instead, in one query of capped counts. A count equal to the cap should
+    be read as "at least that many".
+    """
+    if not column_names:
+        return {}
+
+    validate_column_field(doctype, column_field)
+
+    count_filters = list(convert_filter_to_tuple(doctype, filters))
+    if estimate:
+        column_counts = []
+        for column_name in column_names:
+            query = get_list_method(doctype)(
+                doctype,
+                fields=[f"`tab{doctype}`.`name`"],
+                filters=[*count_filters, [doctype, column_field, "=", column_name]],
+                order_by=None,
+                page_length=COUNT_ESTIMATE_CAP,
+                run=0,
+            )
+            column_counts.append(
+                f"select {frappe.db.escape(column_name)}, count(*) from ({query}) p"
+            )
+        return {
+            column_value: cint(count)
+            for column_value, count in frappe.db.sql(" union all ".join(column_counts))
+        }
+
+    count_filters.append([doctype, column_field, "in", column_names])
+
+    counts = get_list_method(doctype)(
+        doctype,
+        fields=[
+            f"`tab{doctype}`.`{column_field}` as column_value",
+            f"count(`tab{doctype}`.`name`) as count",
+        ],
+        filters=count_filters,
+        group_by=f"`tab{doctype}`.`{column_field}`",
+        order_by=None,
+    )
+
+    return {d.column_value: cint(d.count) for d in counts}
+
+
+def get_available_kanban_column_options(doctype, column_field):
     if not column_field:
         return []
 
@@ -758,19 +1708,38 @@ def merge_kanban_columns_with_available_options(persisted_columns, available_col
 
 @frappe.whitelist()
 def get_fields_meta(doctype, restricted_fieldtypes=None, as_array=False):
+    fields = get_cached_field_projection(doctype, "fields_meta", build_fields_meta)
+
+    if restricted_fieldtypes:
+        restricted_fieldtypes = frappe.parse_json(restricted_fieldtypes)
+        fields = [
+            field
+            for field in fields
+            if field.get("fieldtype") not in restricted_fieldtypes
+        ]
+
+    if as_array:
+        return fields
+
+    fields_meta = {}
+    for field in fields:
+        fields_meta[field.get("fieldname")] = field
+
+    return fields_meta
+
+
+def build_fields_meta(doctype):
     not_allowed_fieldtypes = [
         "Tab Break",
         "Section Break",
         "Column Break",
     ]
 
-    if restricted_fieldtypes:
-        restricted_fieldtypes = frappe.parse_json(restricted_fieldtypes)
-        not_allowed_fieldtypes += restricted_fieldtypes
-
     fields = frappe.get_meta(doctype).fields
     fields = [
-        field for field in fields if field.fieldtype not in not_allowed_fieldtypes
+        field.as_dict()
+        for field in fields
+        if field.fieldtype not in not_allowed_fieldtypes
     ]
 
     standard_fields = [
@@ -795,21 +1764,7 @@ def get_fields_meta(doctype, restricted_fieldtypes=None, as_array=False):
         {"fieldname": "modified", "fieldtype": "Datetime", "label": "Last Updated On"},
     ]
 
-    for field in standard_fields:
-        if (
-            not restricted_fieldtypes
-            or field.get("fieldtype") not in restricted_fieldtypes
-        ):
-            fields.append(field)
-
-    if as_array:
-        return fields
-
-    fields_meta = {}
-    for field in fields:
-        fields_meta[field.get("fieldname")] = field
-
-    return fields_meta
+    return fields + standard_fields
 
 
 @frappe.whitelist()
@@ -937,9 +1892,17 @@ def get_assigned_users(doctype, name, default_assigned_to=None):
 
 @frappe.whitelist()
 def get_fields(doctype: str, allow_all_fieldtypes: bool = False):
-    not_allowed_fieldtypes = list(frappe.model.no_value_fields) + ["Read Only"]
     if allow_all_fieldtypes:
-        not_allowed_fieldtypes = []
+        return get_cached_field_projection(
+            doctype, "all_fields", lambda doctype: build_fields(doctype, [])
+        )
+
+    return get_cached_field_projection(doctype, "fields", build_fields)
+
+
+def build_fields(doctype, not_allowed_fieldtypes=None):
+    if not_allowed_fieldtypes is None:
+        not_allowed_fieldtypes = list(frappe.model.no_value_fields) + ["Read Only"]
     fields = frappe.get_meta(doctype).fields
 
     _fields = []
@@ -966,42 +1929,149 @@ def get_fields(doctype: str, allow_all_fieldtypes: bool = False):
     return _fields
 
 
-def getCounts(d, doctype):
-    d["_email_count"] = (
-        frappe.db.count(
-            "Communication",
-            filters={
-                "reference_doctype": doctype,
-                "reference_name": d.get("name"),
-                "communication_type": "Communication",
-            },
-        )
-        or 0
-    )
-    d["_email_count"] = d["_email_count"] + frappe.db.count(
+ENGAGEMENT_COUNT_SOURCES = (
+    # (count key, doctype, reference doctype field, reference name field, filters)
+    (
+        "_email_count",
         "Communication",
-        filters={
-            "reference_doctype": doctype,
-            "reference_name": d.get("name"),
-            "communication_type": "Automated Message",
-        },
-    )
-    d["_comment_count"] = frappe.db.count(
+        "reference_doctype",
+        "reference_name",
+        {"communication_type": ["in", ["Communication", "Automated Message"]]},
+    ),
+    (
+        "_comment_count",
         "Comment",
-        filters={
-            "reference_doctype": doctype,
-            "reference_name": d.get("name"),
-            "comment_type": "Comment",
-        },
-    )
-    d["_todo_count"] = frappe.db.count(
-        "ToDo", filters={"reference_type": doctype, "reference_name": d.get("name")}
-    )
-    d["_note_count"] = frappe.db.count(
-        "CRM Note",
-        filters={"parenttype": doctype, "parent": d.get("name")},
-    )
-    return d
+        "reference_doctype",
+        "reference_name",
+        {"comment_type": "Comment"},
+    ),
+    ("_todo_count", "ToDo", "reference_type", "reference_name", {}),
+    ("_note_count", "CRM Note", "parenttype", "parent", {}),
+)
+
+
+# denormalized counters kept on the record, see `update_engagement_counts`
+ENGAGEMENT_COUNT_FIELDS = {
+    "_email_count": "custom_email_count",
+    "_comment_count": "custom_comment_count",
+    "_todo_count": "custom_todo_count",
+    "_note_count": "custom_note_count",
+}
+
+
+@frappe.whitelist()
+def get_engagement_counts(doctype: str, names):
+    """
+    Returns the email, comment, todo and note counts of the given `doctype`
+    records as `{name: {"_email_count": ..., ...}}`, using one GROUP BY query
+    per source regardless of the number of records.
+    """
+    frappe.has_permission(doctype, "read", throw=True)
+
+    names = frappe.parse_json(names) or []
+    if names:
+        # only the records the user can read
+        names = frappe.get_list(
+            doctype,
+            filters={"name": ["in", names]},
+            pluck="name",
+            order_by=None,
+            page_length=len(names),
+        )
+    return count_engagements(doctype, names)
+
+
+def count_engagements(doctype, names, keys=None):
+    sources = [
+        source for source in ENGAGEMENT_COUNT_SOURCES if not keys or source[0] in keys
+    ]
+    counts = {name: {source[0]: 0 for source in sources} for name in names}
+    if not names:
+        return counts
+
+    for key, source, doctype_field, name_field, filters in sources:
+        source_counts = frappe.get_all(
+            source,
+            filters={doctype_field: doctype, name_field: ["in", names], **filters},
+            fields=[f"{name_field} as reference_name", "count(name) as count"],
+            group_by=name_field,
+            order_by=None,
+        )
+        for d in source_counts:
+            if d.reference_name in counts:
+                counts[d.reference_name][key] = cint(d.count)
+
+    return counts
+
+
+def has_engagement_count_fields(doctype):
+    meta = frappe.get_meta(doctype)
+    return all(meta.has_field(field) for field in ENGAGEMENT_COUNT_FIELDS.values())
+
+
+def set_engagement_counts(records, doctype):
+    """
+    Sets the engagement counts on each of the `records` in place. Stored
+    counters are used when the records were fetched with them, otherwise the
+    counts are computed from their sources.
+    """
+    if records and all(
+        field in d for d in records for field in ENGAGEMENT_COUNT_FIELDS.values()
+    ):
+        for d in records:
+            for key, field in ENGAGEMENT_COUNT_FIELDS.items():
+                d[key] = cint(d.get(field))
+        return records
+
+    counts = count_engagements(doctype, [d.get("name") for d in records])
+    for d in records:
+        d.update(counts.get(d.get("name"), {}))
+    return records
+
+
+def update_engagement_counts(doctype, names, keys=None):
+    """Recomputes the stored engagement counters of the given `doctype` records"""
+    if not names or not has_engagement_count_fields(doctype):
+        return
+
+    for name, counts in count_engagements(doctype, names, keys).items():
+        frappe.db.set_value(
+            doctype,
+            name,
+            {ENGAGEMENT_COUNT_FIELDS[key]: count for key, count in counts.items()},
+            update_modified=False,
+        )
+    bump_list_version(doctype)
+
+
+def rebuild_engagement_counts(doctypes=("Lead", "Opportunity")):
+    """Rebuilds the stored engagement counters of all records with one query per counter"""
+    for doctype in doctypes:
+        if not has_engagement_count_fields(doctype):
+            continue
+
+        for key, source, doctype_field, name_field, filters in ENGAGEMENT_COUNT_SOURCES:
+            counts_query = frappe.get_all(
+                source,
+                filters={doctype_field: doctype, **filters},
+                fields=[f"{name_field} as reference_name", "count(name) as count"],
+                group_by=name_field,
+                order_by=None,
+                run=0,
+            )
+            frappe.db.sql(
+                f"""
+                update `tab{doctype}` d
+                left join ({counts_query}) c on c.reference_name = d.name
+                set d.`{ENGAGEMENT_COUNT_FIELDS[key]}` = coalesce(c.count, 0)
+                """
+            )
+
+        frappe.db.commit()
+
+
+def getCounts(d, doctype):
+    return set_engagement_counts([d], doctype)[0]
 
 
 @frappe.whitelist()
@@ -1,5 +1,7 @@
 import frappe
 
+from next_crm.utils import get_role_users
+
 
 @frappe.whitelist()
 def get_users():
@@ -20,14 +22,12 @@ def get_users():
         distinct=True,
     ).run(as_dict=1)
 
+    sales_managers = get_role_users("Sales Manager")
     for user in users:
         if frappe.session.user == user.name:
             user.session_user = True
 
-        user.is_manager = (
-            "Sales Manager" in frappe.get_roles(user.name)
-            or user.name == "Administrator"
-        )
+        user.is_manager = user.name in sales_managers or user.name == "Administrator"
 
         user.google_calendar = frappe.db.get_value(
             "Google Calendar", {"user": user.name, "enable": 1}, "name"
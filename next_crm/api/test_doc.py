@@ -0,0 +1,145 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from next_crm.api import doc
+from next_crm.api.doc import get_data_etag
+from next_crm.doc_events.comment import update_liked_by_index
+from next_crm.doc_events.utils import update_reference_assignment_index
+from next_crm.ncrm.doctype.crm_assignment_index import crm_assignment_index
+
+
+class TestListETag(UnitTestCase):
+    """The list ETag changes on writes that keep `modified`"""
+
+    def setUp(self):
+        self.result = frappe._dict(
+            count=2, modified="2026-01-01 12:00:00", tags_length=0
+        )
+
+        for target, attribute, value in (
+            (
+                doc,
+                "get_list_method",
+                lambda doctype: lambda *args, **kwargs: [self.result],
+            ),
+            (doc, "get_views", lambda doctype: []),
+            (doc, "get_form_script_hash", lambda doctype, view="Form": None),
+            (crm_assignment_index, "sync_reference", lambda *args, **kwargs: None),
+        ):
+            patcher = patch.object(target, attribute, side_effect=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_etag(self):
+        return get_data_etag("Lead", {"status": "Open"}, {"view": {}})
+
+    def commit(self):
+        # the list version changes once the write is committed
+        frappe.db.after_commit.run()
+
+    def test_etag_is_stable(self):
+        self.assertEqual(self.get_etag(), self.get_etag())
+
+    def test_assignment_changes_etag(self):
+        etag = self.get_etag()
+        todo = frappe._dict(
+            reference_type="Lead",
+            reference_name="CRM-LEAD-1",
+            get_doc_before_save=lambda: None,
+        )
+
+        update_reference_assignment_index(
+            todo, "_assign", "reference_type", "reference_name"
+        )
+        self.assertEqual(self.get_etag(), etag)
+
+        self.commit()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_like_changes_etag(self):
+        etag = self.get_etag()
+        like = frappe._dict(
+            comment_type="Like",
+            reference_doctype="Lead",
+            reference_name="CRM-LEAD-1",
+            get_doc_before_save=lambda: None,
+        )
+
+        update_liked_by_index(like)
+        self.commit()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_tag_changes_etag(self):
+        etag = self.get_etag()
+
+        # tags are written without `modified` or any hook
+        self.result.tags_length = len('["hot"]')
+        tagged = self.get_etag()
+        self.assertNotEqual(tagged, etag)
+
+        self.result.tags_length = 0
+        self.assertNotEqual(self.get_etag(), tagged)
+
+    def test_engagement_counter_changes_etag(self):
+        etag = self.get_etag()
+
+        with (
+            patch.object(doc, "count_engagements", return_value={}),
+            patch.object(doc, "has_engagement_count_fields", return_value=True),
+        ):
+            doc.update_engagement_counts("Lead", ["CRM-LEAD-1"], ["_comment_count"])
+
+        self.commit()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_language_changes_etag(self):
+        etag = self.get_etag()
+
+        # labels and options of the response are translated
+        with patch.object(frappe.local, "lang", "de"):
+            self.assertNotEqual(self.get_etag(), etag)
+
+    def test_writes_to_other_doctypes_keep_etag(self):
+        etag = self.get_etag()
+
+        doc.bump_list_version("Opportunity")
+        self.commit()
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_delta_version_moves_with_writes_that_keep_modified(self):
+        version = doc.get_delta_version("Lead", self.result)
+        self.assertEqual(doc.get_delta_version("Lead", self.result), version)
+
+        doc.bump_list_version("Lead")
+        self.commit()
+        bumped = doc.get_delta_version("Lead", self.result)
+        self.assertNotEqual(bumped, version)
+
+        self.result.tags_length = len('["hot"]')
+        self.assertNotEqual(doc.get_delta_version("Lead", self.result), bumped)
+
+
+@patch.object(doc, "validate_column_field")
+class TestKanbanColumnCounts(UnitTestCase):
+    def test_estimate_caps_each_column(self, validate_column_field):
+        def list_method(doctype, **kwargs):
+            return f"select `name` from `tab{doctype}`"
+
+        with (
+            patch.object(doc, "get_list_method", return_value=list_method),
+            patch.object(
+                doc.frappe.db, "sql", return_value=[("Open", 10000), ("Won", 3)]
+            ) as sql,
+        ):
+            counts = doc.get_kanban_column_counts(
+                "Lead", {}, "status", ["Open", "Won"], estimate=True
+            )
+
+        self.assertEqual(counts, {"Open": 10000, "Won": 3})
+        sql.assert_called_once()
+        self.assertEqual(sql.call_args.args[0].count("union all"), 1)
@@ -0,0 +1,77 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import click
+import frappe
+from frappe.commands import get_site
+
+from next_crm.indexes import add_index, get_view_index_suggestions
+
+
+@click.command("advise-crm-indexes")
+@click.option("--create", is_flag=True, help="Create the suggested indexes")
+@click.pass_context
+def advise_indexes(context, create=False):
+    "Suggest indexes for the filters of saved CRM views"
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        suggestions = get_view_index_suggestions()
+        if not suggestions:
+            click.secho("No missing indexes found", fg="green")
+
+        for suggestion in suggestions:
+            fields = ", ".join(suggestion["fields"])
+            views = ", ".join(suggestion["views"])
+            click.echo(f"{suggestion['doctype']} ({fields}) used by {views}")
+            if create:
+                add_index(suggestion["doctype"], suggestion["fields"])
+
+        if create and suggestions:
+            click.secho(f"Created {len(suggestions)} indexes", fg="green")
+    finally:
+        frappe.destroy()
+
+
+@click.command("benchmark-timeline-grouping")
+@click.option("--count", default=10000, help="Number of synthetic activities")
+@click.option("--repeat", default=5, help="Number of timed runs")
+def benchmark_timeline_grouping(count=10000, repeat=5):
+    "Time the grouping of versions in the activity timeline"
+    from next_crm.api.activities import handle_multiple_versions
+
+    activities = get_synthetic_activities(count)
+    runs = timeit.repeat(
+        lambda: handle_multiple_versions(activities), number=1, repeat=repeat
+    )
+    grouped = handle_multiple_versions(activities)
+    click.echo(
+        f"{count} activities grouped into {len(grouped)} in "
+        f"{min(runs) * 1000:.2f} ms (best of {repeat})"
+    )
+
+
+def get_synthetic_activities(count):
+    """Returns `count` timeline activities, newest first, mostly versions by a few users"""
+    rng = random.Random(count)
+    owners = [f"user{idx}@example.com" for idx in range(3)]
+    activity_types = ["changed", "added", "removed", "comment", "communication"]
+
+    return [
+        {
+            "name": f"activity-{idx}",
+            "activity_type": rng.choices(activity_types, weights=[6, 2, 1, 1, 1])[0],
+            "creation": datetime(2026, 1, 1) - timedelta(minutes=idx),
+            "owner": rng.choice(owners),
+            "data": {"field": "status", "field_label": "Status", "value": str(idx)},
+            "is_lead": False,
+        }
+        for idx in range(count)
+    ]
+
+
+commands = [advise_indexes, benchmark_timeline_grouping]
@@ -1,6 +1,11 @@
 import frappe
 
 from next_crm.api.comment import notify_mentions
+from next_crm.doc_events.utils import (
+    update_activity_feed,
+    update_reference_assignment_index,
+    update_reference_engagement_count,
+)
 
 
 def on_update(doc, method=None):
@@ -11,3 +16,32 @@ def on_update(doc, method=None):
         or doc.reference_doctype in ["Address", "Contact"]
     ):
         notify_mentions(doc)
+
+    update_comment_count(doc)
+    update_liked_by_index(doc)
+    update_comment_feed(doc)
+
+
+def after_delete(doc, method=None):
+    update_comment_count(doc)
+    update_liked_by_index(doc)
+    update_comment_feed(doc)
+
+
+def update_comment_count(doc):
+    if doc.comment_type == "Comment":
+        update_reference_engagement_count(
+            doc, "_comment_count", "reference_doctype", "reference_name"
+        )
+
+
+def update_liked_by_index(doc):
+    if doc.comment_type == "Like":
+        update_reference_assignment_index(
+            doc, "_liked_by", "reference_doctype", "reference_name"
+        )
+
+
+def update_comment_feed(doc):
+    if doc.comment_type in ["Comment", "Info", "Attachment", "Attachment Removed"]:
+        update_activity_feed(doc)
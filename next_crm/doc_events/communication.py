@@ -0,0 +1,21 @@
+from next_crm.doc_events.utils import (
+    update_activity_feed,
+    update_reference_engagement_count,
+)
+
+
+def on_update(doc, method=None):
+    update_email_count(doc)
+    update_activity_feed(doc)
+
+
+def after_delete(doc, method=None):
+    update_email_count(doc)
+    update_activity_feed(doc)
+
+
+def update_email_count(doc):
+    if doc.communication_type in ["Communication", "Automated Message"]:
+        update_reference_engagement_count(
+            doc, "_email_count", "reference_doctype", "reference_name"
+        )
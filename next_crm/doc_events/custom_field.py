@@ -0,0 +1,9 @@
+from next_crm.utils import clear_field_projection_cache
+
+
+def on_update(doc, method=None):
+    clear_field_projection_cache(doc.dt)
+
+
+def on_trash(doc, method=None):
+    clear_field_projection_cache(doc.dt)
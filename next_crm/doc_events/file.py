@@ -0,0 +1,23 @@
+import frappe
+
+from next_crm.doc_events.utils import update_activity_feed
+
+
+def after_insert(doc, method=None):
+    update_attached_to_feed(doc)
+
+
+def after_delete(doc, method=None):
+    update_attached_to_feed(doc)
+
+
+def update_attached_to_feed(doc):
+    """Refreshes the attachments shown on the comment or email `doc` is attached to"""
+    if (
+        doc.attached_to_doctype in ["Comment", "Communication"]
+        and doc.attached_to_name
+        and frappe.db.exists(doc.attached_to_doctype, doc.attached_to_name)
+    ):
+        update_activity_feed(
+            frappe.get_doc(doc.attached_to_doctype, doc.attached_to_name)
+        )
@@ -1,4 +1,8 @@
 from next_crm.doc_events.utils import delete_attachments_from_crm_notes
+from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import (
+    delete_reference_feed,
+)
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import delete_reference_ranks
 
 
 def on_update(doc, method=None):
@@ -8,3 +12,5 @@ def on_update(doc, method=None):
 
 def on_trash(doc, method=None):
     delete_attachments_from_crm_notes(doc.doctype, doc.name)
+    delete_reference_feed(doc.doctype, doc.name)
+    delete_reference_ranks(doc.doctype, doc.name)
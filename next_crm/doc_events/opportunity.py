@@ -2,6 +2,10 @@ import frappe
 
 from next_crm.api.opportunity import create_checklist
 from next_crm.doc_events.utils import delete_attachments_from_crm_notes
+from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import (
+    delete_reference_feed,
+)
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import delete_reference_ranks
 
 
 def before_save(doc, method=None):
@@ -32,6 +36,8 @@ def on_trash(doc, method=None):
     if "frappe_gmail_thread" in frappe.get_installed_apps():
         unlink_gmail_thread(doc.name)
     delete_attachments_from_crm_notes(doc.doctype, doc.name)
+    delete_reference_feed(doc.doctype, doc.name)
+    delete_reference_ranks(doc.doctype, doc.name)
 
 
 def delete_linked_event(docname):
@@ -0,0 +1,9 @@
+from next_crm.utils import clear_role_holders_cache
+
+
+def on_update(doc, method=None):
+    clear_role_holders_cache()
+
+
+def on_trash(doc, method=None):
+    clear_role_holders_cache()
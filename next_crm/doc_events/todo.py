@@ -1,6 +1,11 @@
 import frappe
 
 from next_crm.api.todo import notify_assigned_user
+from next_crm.doc_events.utils import (
+    update_reference_assignment_index,
+    update_reference_engagement_count,
+)
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import delete_reference_ranks
 
 
 def before_insert(doc, method=None):
@@ -19,6 +24,10 @@ def before_insert(doc, method=None):
 
 
 def after_insert(doc, method=None):
+    update_reference_engagement_count(
+        doc, "_todo_count", "reference_type", "reference_name"
+    )
+
     if (
         doc.reference_type in ["Lead", "Opportunity"]
         and doc.reference_name
@@ -44,6 +53,10 @@ def after_insert(doc, method=None):
 
 
 def on_update(doc, method=None):
+    update_reference_assignment_index(
+        doc, "_assign", "reference_type", "reference_name"
+    )
+
     if (
         doc.has_value_changed("status")
         and doc.status == "Cancelled"
@@ -55,6 +68,7 @@ def on_update(doc, method=None):
 
 
 def on_trash(doc, method=None):
+    delete_reference_ranks(doc.doctype, doc.name)
     if doc.custom_linked_event:
         frappe.delete_doc(
             "Event",
@@ -62,3 +76,12 @@ def on_trash(doc, method=None):
             ignore_permissions=True,
             force=True,
         )
+
+
+def after_delete(doc, method=None):
+    update_reference_engagement_count(
+        doc, "_todo_count", "reference_type", "reference_name"
+    )
+    update_reference_assignment_index(
+        doc, "_assign", "reference_type", "reference_name"
+    )
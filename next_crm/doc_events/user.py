@@ -1,6 +1,8 @@
 import frappe
 from frappe import _
 
+from next_crm.utils import clear_role_holders_cache
+
 
 def before_validate(doc, method=None):
     if (
@@ -14,3 +16,11 @@ def before_validate(doc, method=None):
             ),
             frappe.PermissionError,
         )
+
+
+def on_update(doc, method=None):
+    clear_role_holders_cache()
+
+
+def on_trash(doc, method=None):
+    clear_role_holders_cache()
@@ -39,3 +39,68 @@ def delete_attachments_from_crm_notes(doctype, docname):
             frappe.log_error(
                 f"Failed to delete file {file_name}: {e}", "File Deletion Error"
             )
+
+
+def update_reference_engagement_count(doc, key, doctype_field, name_field):
+    """
+    Refreshes the stored engagement counter `key` of the Lead or Opportunity
+    referenced by `doc`, and of the previous reference if it was changed.
+    """
+    from next_crm.api.doc import update_engagement_counts
+
+    references = {(doc.get(doctype_field), doc.get(name_field))}
+    if doc_before_save := doc.get_doc_before_save():
+        references.add(
+            (doc_before_save.get(doctype_field), doc_before_save.get(name_field))
+        )
+
+    for doctype, name in references:
+        if doctype in ("Lead", "Opportunity") and name:
+            update_engagement_counts(doctype, [name], [key])
+
+
+def update_activity_feed(doc):
+    """
+    Refreshes the CRM Activity Feed rows of the Comment or Communication
+    `doc`, if it is or was linked to a Lead or Opportunity.
+    """
+    from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import sync_source
+
+    references = get_feed_references(doc)
+    if doc_before_save := doc.get_doc_before_save():
+        references |= get_feed_references(doc_before_save)
+
+    sync_source(doc.doctype, doc.name, references)
+
+
+def get_feed_references(doc):
+    """Returns the `(doctype, name)` pairs `doc` is linked to, on its timeline links as well"""
+    return {
+        (doc.get("reference_doctype"), doc.get("reference_name")),
+        *(
+            (link.link_doctype, link.link_name)
+            for link in doc.get("timeline_links") or []
+        ),
+    }
+
+
+def update_reference_assignment_index(doc, column, doctype_field, name_field):
+    """
+    Refreshes the CRM Assignment Index rows for `column` of the document
+    referenced by `doc`, and of the previous reference if it was changed.
+    """
+    from next_crm.api.doc import bump_list_version
+    from next_crm.ncrm.doctype.crm_assignment_index.crm_assignment_index import (
+        sync_reference,
+    )
+
+    references = {(doc.get(doctype_field), doc.get(name_field))}
+    if doc_before_save := doc.get_doc_before_save():
+        references.add(
+            (doc_before_save.get(doctype_field), doc_before_save.get(name_field))
+        )
+
+    for doctype, name in references:
+        sync_reference(doctype, name, [column])
+        if doctype and name:
+            bump_list_version(doctype)
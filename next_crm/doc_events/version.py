@@ -0,0 +1,5 @@
+from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import add_version
+
+
+def after_insert(doc, method=None):
+    add_version(doc)
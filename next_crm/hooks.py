@@ -88,6 +88,13 @@ website_route_rules = [
 
 before_install = "next_crm.install.before_install"
 after_install = "next_crm.install.after_install"
+after_migrate = "next_crm.indexes.after_migrate"
+
+# Cache
+# ------------
+# cleared along with the site cache, e.g. by `bench clear-cache`
+
+clear_cache = "next_crm.utils.clear_cache"
 
 # Uninstallation
 # ------------
@@ -160,9 +167,30 @@ doc_events = {
         "on_update": ["next_crm.doc_events.todo.on_update"],
         "before_insert": ["next_crm.doc_events.todo.before_insert"],
         "on_trash": ["next_crm.doc_events.todo.on_trash"],
+        "after_delete": ["next_crm.doc_events.todo.after_delete"],
     },
     "Comment": {
         "on_update": ["next_crm.doc_events.comment.on_update"],
+        "after_delete": ["next_crm.doc_events.comment.after_delete"],
+    },
+    "Custom Field": {
+        "on_update": ["next_crm.doc_events.custom_field.on_update"],
+        "on_trash": ["next_crm.doc_events.custom_field.on_trash"],
+    },
+    "Property Setter": {
+        "on_update": ["next_crm.doc_events.property_setter.on_update"],
+        "on_trash": ["next_crm.doc_events.property_setter.on_trash"],
+    },
+    "Communication": {
+        "on_update": ["next_crm.doc_events.communication.on_update"],
+        "after_delete": ["next_crm.doc_events.communication.after_delete"],
+    },
+    "Version": {
+        "after_insert": ["next_crm.doc_events.version.after_insert"],
+    },
+    "File": {
+        "after_insert": ["next_crm.doc_events.file.after_insert"],
+        "after_delete": ["next_crm.doc_events.file.after_delete"],
     },
     "WhatsApp Message": {
         "validate": ["next_crm.doc_events.whatsapp_message.validate"],
@@ -170,6 +198,16 @@ doc_events = {
     },
     "User": {
         "before_validate": ["next_crm.doc_events.user.before_validate"],
+        "on_update": ["next_crm.doc_events.user.on_update"],
+        "on_trash": ["next_crm.doc_events.user.on_trash"],
+    },
+    "Report": {
+        "on_update": ["next_crm.doc_events.report.on_update"],
+        "on_trash": ["next_crm.doc_events.report.on_trash"],
+    },
+    "Role": {
+        "on_update": ["next_crm.doc_events.role.on_update"],
+        "on_trash": ["next_crm.doc_events.role.on_trash"],
     },
     "Opportunity": {
         "on_trash": ["next_crm.doc_events.opportunity.on_trash"],
@@ -206,6 +244,12 @@ doc_events = {
 # 	],
 # }
 
+scheduler_events = {
+    "weekly": [
+        "next_crm.api.doc.rebuild_engagement_counts",
+    ],
+}
+
 # Testing
 # -------
 
@@ -0,0 +1,175 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+import json
+
+import frappe
+from frappe.model.document import get_controller
+
+# Doctypes listed by the CRM views, see `get_data`
+LIST_VIEW_DOCTYPES = (
+    "Lead",
+    "Opportunity",
+    "Prospect",
+    "Customer",
+    "Contact",
+    "Address",
+    "ToDo",
+    "CRM Call Log",
+)
+
+# Field types whose values are compared as a whole, so an index helps
+INDEXABLE_FIELDTYPES = (
+    "Link",
+    "Dynamic Link",
+    "Select",
+    "Check",
+    "Int",
+    "Float",
+    "Currency",
+    "Date",
+    "Datetime",
+)
+
+# Standard columns and the field type used to decide whether to index them
+STANDARD_FIELDTYPES = {
+    "owner": "Link",
+    "modified_by": "Link",
+    "creation": "Datetime",
+    "modified": "Datetime",
+    "docstatus": "Int",
+}
+
+# Column the list views sort by unless a view says otherwise
+DEFAULT_SORT_FIELD = "modified"
+
+
+def after_migrate():
+    add_list_view_indexes()
+
+
+def add_list_view_indexes():
+    """
+    Adds an index on (field, modified) for the default list and kanban columns
+    and the quick filters of every CRM list view doctype, so the default views
+    filter and sort on an index.
+    """
+    for doctype in LIST_VIEW_DOCTYPES:
+        if not frappe.db.table_exists(doctype):
+            continue
+
+        for fields in get_default_indexes(doctype):
+            add_index(doctype, fields)
+
+
+def get_default_indexes(doctype):
+    """Returns the indexes the default views of `doctype` need as lists of columns"""
+    _list = get_controller(doctype)
+    fieldnames = []
+
+    if hasattr(_list, "default_list_data"):
+        columns = _list.default_list_data().get("columns") or []
+        fieldnames += [column.get("key") for column in columns]
+
+    if hasattr(_list, "default_kanban_settings"):
+        kanban_settings = _list.default_kanban_settings()
+        fieldnames.append(kanban_settings.get("column_field"))
+        fieldnames += json.loads(kanban_settings.get("kanban_fields") or "[]")
+
+    meta = frappe.get_meta(doctype)
+    fieldnames += [field.fieldname for field in meta.fields if field.in_standard_filter]
+
+    return [
+        get_index_columns(fieldname)
+        for fieldname in dict.fromkeys(fieldnames)
+        if is_indexable(doctype, fieldname)
+    ]
+
+
+def get_index_columns(fieldname, sort_field=DEFAULT_SORT_FIELD):
+    if not sort_field or fieldname == sort_field:
+        return [fieldname]
+    return [fieldname, sort_field]
+
+
+def is_indexable(doctype, fieldname):
+    if not fieldname:
+        return False
+
+    fieldtype = STANDARD_FIELDTYPES.get(fieldname)
+    if not fieldtype:
+        field = frappe.get_meta(doctype).get_field(fieldname)
+        fieldtype = field.fieldtype if field else None
+
+    return fieldtype in INDEXABLE_FIELDTYPES and frappe.db.has_column(
+        doctype, fieldname
+    )
+
+
+def get_existing_indexes(doctype):
+    """Returns the columns of every index of `doctype`, in index order"""
+    indexes = {}
+    for row in frappe.db.sql(f"show index from `tab{doctype}`", as_dict=True):
+        indexes.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+
+    return [
+        [column for _seq, column in sorted(columns)] for columns in indexes.values()
+    ]
+
+
+def has_index(doctype, fields):
+    """Returns whether an existing index of `doctype` starts with `fields`"""
+    return any(
+        columns[: len(fields)] == fields for columns in get_existing_indexes(doctype)
+    )
+
+
+def add_index(doctype, fields):
+    if has_index(doctype, fields):
+        return False
+
+    frappe.db.add_index(doctype, fields)
+    return True
+
+
+def get_view_index_suggestions():
+    """
+    Returns the indexes missing for the filters and sort order of the saved
+    CRM View Settings, as `{"doctype", "fields", "views"}` dicts.
+    """
+    suggestions = {}
+    views = frappe.get_all(
+        "CRM View Settings",
+        fields=["name", "dt", "type", "filters", "order_by", "column_field"],
+    )
+
+    for view in views:
+        if not view.dt or not frappe.db.table_exists(view.dt):
+            continue
+
+        try:
+            filters = json.loads(view.filters or "{}") or {}
+        except ValueError:
+            continue
+
+        sort_field = (view.order_by or DEFAULT_SORT_FIELD).split(",")[0].split()[0]
+        sort_field = sort_field.replace("`", "").split(".")[-1]
+        if not is_indexable(view.dt, sort_field):
+            sort_field = None
+
+        fieldnames = list(filters)
+        if view.type == "kanban" and view.column_field:
+            fieldnames.append(view.column_field)
+
+        for fieldname in dict.fromkeys(fieldnames):
+            if not is_indexable(view.dt, fieldname):
+                continue
+
+            fields = get_index_columns(fieldname, sort_field)
+            key = (view.dt, tuple(fields))
+            if key not in suggestions:
+                if has_index(view.dt, fields):
+                    continue
+                suggestions[key] = {"doctype": view.dt, "fields": fields, "views": []}
+            suggestions[key]["views"].append(view.name)
+
+    return list(suggestions.values())
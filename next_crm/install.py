@@ -1,9 +1,13 @@
 # Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
 # MIT License. See license.txt
+import json
+
 import click
 import frappe
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
+from next_crm.indexes import add_list_view_indexes
+
 
 def before_install():
     installed_apps = frappe.get_installed_apps()
@@ -23,6 +27,7 @@ def after_install(force=False):
     add_property_setter()
     add_email_template_custom_fields()
     add_todo_custom_title_field()
+    add_list_view_indexes()
     erpnext_crm_settings = frappe.get_single("ERPNext CRM Settings")
     erpnext_crm_settings.enabled = True
     erpnext_crm_settings.save()
@@ -263,3 +268,29 @@ def add_todo_custom_title_field():
             ],
         }
         create_custom_fields(custom_fields, ignore_validate=True)
+
+
+def add_engagement_count_custom_fields():
+    """
+    Creates the engagement counter fields of Lead and Opportunity from the
+    fixture, for patches that run before the fixtures are synced.
+    """
+    from next_crm.api.doc import ENGAGEMENT_COUNT_FIELDS
+
+    fieldnames = {"custom_engagement_section", *ENGAGEMENT_COUNT_FIELDS.values()}
+    fixture = frappe.get_app_path("next_crm", "fixtures", "custom_field.json")
+    with open(fixture) as f:
+        fixture_fields = json.load(f)
+
+    custom_fields = {}
+    for field in fixture_fields:
+        if field["fieldname"] not in fieldnames:
+            continue
+        field = {
+            key: value
+            for key, value in field.items()
+            if key not in ("doctype", "name", "modified")
+        }
+        custom_fields.setdefault(field.pop("dt"), []).append(field)
+
+    create_custom_fields(custom_fields, ignore_validate=True)
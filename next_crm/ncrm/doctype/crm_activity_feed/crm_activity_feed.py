@@ -0,0 +1,393 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+# Doctypes whose timeline is kept in the feed
+FEED_DOCTYPES = ("Lead", "Opportunity")
+
+# Activity types of Version rows, grouped by owner when written
+VERSION_ACTIVITY_TYPES = ("changed", "added", "removed")
+
+# Fields of emails updated without running their hooks, as sending and
+# open tracking do, so they are read live instead of from the feed
+LIVE_COMMUNICATION_FIELDS = ("delivery_status", "read_by_recipient")
+
+# Default set once every Lead and Opportunity has a feed, see `is_feed_built`
+FEED_BUILT_KEY = "crm_activity_feed_built"
+
+
+class CRMActivityFeed(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index(
+        "CRM Activity Feed", ["reference_doctype", "reference_name", "activity_on"]
+    )
+    frappe.db.add_index("CRM Activity Feed", ["source_doctype", "source_name"])
+
+
+def is_feed_built():
+    return bool(frappe.db.get_default(FEED_BUILT_KEY))
+
+
+def get_feed(doctype, name, skip_events=False, activity_type=None, limit=None):
+    """Returns the timeline activities of `doctype` `name`, newest first"""
+    filters = {"reference_doctype": doctype, "reference_name": name}
+    if skip_events:
+        filters["is_event"] = 0
+    if activity_type:
+        filters["activity_type"] = activity_type
+
+    rows = frappe.get_all(
+        "CRM Activity Feed",
+        filters=filters,
+        fields=["data"],
+        order_by="activity_on desc",
+        limit=limit,
+    )
+    activities = [frappe.parse_json(row.data) for row in rows]
+    set_live_communication_fields(activities)
+    return activities
+
+
+def set_live_communication_fields(activities):
+    """Sets the current `LIVE_COMMUNICATION_FIELDS` on the emails of `activities`"""
+    communications = [
+        activity
+        for activity in activities
+        if activity["activity_type"] == "communication"
+    ]
+    if not communications:
+        return
+
+    values = {
+        communication.name: communication
+        for communication in frappe.get_all(
+            "Communication",
+            filters={"name": ["in", [c["name"] for c in communications]]},
+            fields=["name", *LIVE_COMMUNICATION_FIELDS],
+        )
+    }
+    for activity in communications:
+        if live := values.get(activity["name"]):
+            activity["data"].update(
+                {field: live[field] for field in LIVE_COMMUNICATION_FIELDS}
+            )
+
+
+def add_version(version):
+    """
+    Adds the timeline activity of `version` to the feed of its document. A
+    change made right after one by the same user is grouped with it, the way
+    `handle_multiple_versions` groups them on read.
+    """
+    from next_crm.api.activities import get_timeline_fields, get_version_activity
+
+    if version.ref_doctype not in FEED_DOCTYPES:
+        return
+
+    activity = get_version_activity(
+        version, version.ref_doctype, get_timeline_fields(version.ref_doctype)
+    )
+    if not activity:
+        return
+
+    latest = frappe.db.get_value(
+        "CRM Activity Feed",
+        {"reference_doctype": version.ref_doctype, "reference_name": version.docname},
+        ["name", "activity_type", "data"],
+        order_by="activity_on desc",
+        as_dict=True,
+    )
+    if latest and latest.activity_type in VERSION_ACTIVITY_TYPES:
+        head = frappe.parse_json(latest.data)
+        if head.get("owner") == activity["owner"]:
+            other_versions = head.pop("other_versions", None) or []
+            activity["other_versions"] = [head, *other_versions]
+            frappe.db.set_value(
+                "CRM Activity Feed",
+                latest.name,
+                {
+                    "source_name": version.name,
+                    "activity_type": activity["activity_type"],
+                    "activity_on": activity["creation"],
+                    "data": frappe.as_json(activity),
+                },
+                update_modified=False,
+            )
+            return
+
+    insert_rows([get_row(version.ref_doctype, version.docname, activity)])
+
+
+def sync_source(source_doctype, source_name, references):
+    """
+    Replaces the feed rows of a Comment or Communication with its current
+    activities. `references` are the `(doctype, name)` pairs it is or was
+    linked to, sources not shown on a Lead or Opportunity are skipped.
+    """
+    references = sorted(
+        (doctype, name)
+        for doctype, name in references
+        if doctype in FEED_DOCTYPES and name
+    )
+    if not references:
+        return
+
+    # waits for a rebuild of these feeds, see `rebuild_feed_chunk`
+    for doctype, name in references:
+        lock_reference(doctype, name)
+
+    frappe.db.delete(
+        "CRM Activity Feed",
+        {"source_doctype": source_doctype, "source_name": source_name},
+    )
+
+    if source_doctype == "Comment":
+        rows = get_comment_rows(source_name)
+    else:
+        rows = get_communication_rows(source_name)
+    insert_rows(rows)
+
+
+def lock_reference(doctype, name):
+    frappe.db.get_value(doctype, name, "name", for_update=True)
+
+
+def get_comment_rows(name):
+    from next_crm.api.activities import (
+        get_attachment_log_activity,
+        get_comment_activity,
+    )
+
+    comment = frappe.db.get_value(
+        "Comment",
+        name,
+        [
+            "name",
+            "creation",
+            "owner",
+            "content",
+            "comment_type",
+            "reference_doctype",
+            "reference_name",
+        ],
+        as_dict=True,
+    )
+    if not comment or comment.reference_doctype not in FEED_DOCTYPES:
+        return []
+
+    is_lead = comment.reference_doctype == "Lead"
+    if comment.comment_type == "Comment" or (
+        comment.comment_type == "Info" and not is_lead
+    ):
+        activity = get_comment_activity(comment, is_lead)
+    elif comment.comment_type in ("Attachment", "Attachment Removed"):
+        activity = get_attachment_log_activity(comment, is_lead)
+    else:
+        return []
+
+    return [get_row(comment.reference_doctype, comment.reference_name, activity)]
+
+
+def get_communication_rows(name):
+    from next_crm.api.activities import COMMUNICATION_FIELDS, get_communication_activity
+
+    communication = frappe.db.get_value(
+        "Communication",
+        name,
+        [*COMMUNICATION_FIELDS, "reference_doctype", "reference_name"],
+        as_dict=True,
+    )
+    if not communication or communication.communication_type not in (
+        "Communication",
+        "Automated Message",
+    ):
+        return []
+
+    references = {(communication.reference_doctype, communication.reference_name)}
+    links = frappe.get_all(
+        "Communication Link",
+        filters={"parent": name, "link_doctype": ["in", FEED_DOCTYPES]},
+        fields=["link_doctype", "link_name"],
+    )
+    references.update((link.link_doctype, link.link_name) for link in links)
+
+    is_event = communication.communication_medium == "Event"
+    return [
+        get_row(
+            doctype,
+            reference_name,
+            get_communication_activity(communication, doctype == "Lead"),
+            is_event,
+        )
+        for doctype, reference_name in references
+        if doctype in FEED_DOCTYPES and reference_name
+    ]
+
+
+def get_row(doctype, name, activity, is_event=False):
+    return {
+        "reference_doctype": doctype,
+        "reference_name": name,
+        "source_doctype": get_source_doctype(activity),
+        "source_name": activity["name"],
+        "activity_type": activity["activity_type"],
+        "activity_on": activity["creation"],
+        "is_event": int(is_event),
+        "data": activity,
+    }
+
+
+def get_source_doctype(activity):
+    if activity["activity_type"] in VERSION_ACTIVITY_TYPES:
+        return "Version"
+    if activity["activity_type"] == "communication":
+        return "Communication"
+    return "Comment"
+
+
+def insert_rows(rows):
+    timestamp = now()
+    values = [
+        (
+            frappe.generate_hash(length=10),
+            row["reference_doctype"],
+            row["reference_name"],
+            row["source_doctype"],
+            row["source_name"],
+            row["activity_type"],
+            row["activity_on"],
+            row["is_event"],
+            frappe.as_json(row["data"]),
+            timestamp,
+            timestamp,
+            "Administrator",
+            "Administrator",
+        )
+        for row in rows
+    ]
+
+    if values:
+        frappe.db.bulk_insert(
+            "CRM Activity Feed",
+            fields=[
+                "name",
+                "reference_doctype",
+                "reference_name",
+                "source_doctype",
+                "source_name",
+                "activity_type",
+                "activity_on",
+                "is_event",
+                "data",
+                "creation",
+                "modified",
+                "owner",
+                "modified_by",
+            ],
+            values=values,
+        )
+
+
+def delete_reference_feed(doctype, name):
+    frappe.db.delete(
+        "CRM Activity Feed", {"reference_doctype": doctype, "reference_name": name}
+    )
+
+
+def get_reference_rows(doctype, name):
+    """Returns the feed rows of `doctype` `name` rebuilt from its versions, comments and emails"""
+    from next_crm.api.activities import (
+        get_activity_key,
+        get_record_sources,
+        handle_multiple_versions,
+    )
+
+    activities = {}
+    for source in get_record_sources(doctype, name, None, 500):
+        for activity in source:
+            activities.setdefault(get_activity_key(activity), activity)
+
+    activities = list(activities.values())
+    activities.sort(key=lambda x: x["creation"], reverse=True)
+    activities = handle_multiple_versions(activities)
+
+    communications = [
+        activity["name"]
+        for activity in activities
+        if activity["activity_type"] == "communication"
+    ]
+    events = set(
+        frappe.get_all(
+            "Communication",
+            filters={"name": ["in", communications], "communication_medium": "Event"},
+            pluck="name",
+        )
+        if communications
+        else []
+    )
+
+    return [
+        get_row(doctype, name, activity, activity["name"] in events)
+        for activity in activities
+    ]
+
+
+def rebuild_feed(doctypes=FEED_DOCTYPES, chunk_size=500):
+    """
+    Rebuilds the feed of every document of `doctypes` from their timeline
+    sources, in one background job per `chunk_size` documents.
+    """
+    enqueue_feed_chunk(list(doctypes), None, chunk_size)
+
+
+def enqueue_feed_chunk(doctypes, after, chunk_size):
+    frappe.enqueue(
+        rebuild_feed_chunk,
+        queue="long",
+        timeout=1800,
+        enqueue_after_commit=True,
+        doctypes=doctypes,
+        after=after,
+        chunk_size=chunk_size,
+    )
+
+
+def rebuild_feed_chunk(doctypes, after=None, chunk_size=500):
+    """
+    Rebuilds the feed of the next `chunk_size` documents of the first of
+    `doctypes` named after `after`, then queues the following chunk.
+
+    Each document is rebuilt in its own transaction holding a lock on it,
+    which `sync_source` waits for, so comments and emails saved meanwhile
+    are neither lost nor duplicated.
+    """
+    doctype = doctypes[0]
+    names = frappe.get_all(
+        doctype,
+        filters={"name": [">", after]} if after else None,
+        order_by="name asc",
+        page_length=chunk_size,
+        pluck="name",
+    )
+    for name in names:
+        # the sources are read after the lock, not from an older snapshot
+        frappe.db.commit()
+        lock_reference(doctype, name)
+
+        rows = get_reference_rows(doctype, name)
+        delete_reference_feed(doctype, name)
+        insert_rows(rows)
+    frappe.db.commit()
+
+    if len(names) == chunk_size:
+        enqueue_feed_chunk(doctypes, names[-1], chunk_size)
+    elif len(doctypes) > 1:
+        enqueue_feed_chunk(doctypes[1:], None, chunk_size)
+    else:
+        frappe.db.set_default(FEED_BUILT_KEY, 1)
@@ -0,0 +1,284 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import json
+import random
+from copy import deepcopy
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+from frappe.utils import get_datetime
+
+from next_crm.api import activities
+from next_crm.api.activities import get_activity_page, handle_multiple_versions
+from next_crm.ncrm.doctype.crm_activity_feed import crm_activity_feed
+from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import (
+    add_version,
+    sync_source,
+)
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def get_activity(idx, activity_type, owner, creation=None):
+    return {
+        "name": f"ACT-{idx}",
+        "activity_type": activity_type,
+        "creation": creation or NOW + timedelta(minutes=idx),
+        "owner": owner,
+        "data": {},
+    }
+
+
+def baseline_handle_multiple_versions(versions):
+    """`handle_multiple_versions` as it was before versions were grouped in one pass"""
+    result = []
+    grouped_versions = []
+    old_version = None
+    for version in versions:
+        is_version = version["activity_type"] in ["changed", "added", "removed"]
+        if not is_version:
+            result.append(version)
+        if not old_version:
+            old_version = version
+            if is_version:
+                grouped_versions.append(version)
+            continue
+        if (
+            is_version
+            and old_version.get("owner")
+            and version["owner"] == old_version["owner"]
+        ):
+            grouped_versions.append(version)
+        else:
+            if grouped_versions:
+                result.append(baseline_parse_grouped_versions(grouped_versions))
+            grouped_versions = []
+            if is_version:
+                grouped_versions.append(version)
+        old_version = version
+        if version == versions[-1] and grouped_versions:
+            result.append(baseline_parse_grouped_versions(grouped_versions))
+
+    return result
+
+
+def baseline_parse_grouped_versions(versions):
+    version = versions[0]
+    if len(versions) == 1:
+        return version
+    version["other_versions"] = versions[1:]
+    return version
+
+
+class TestCRMActivityFeed(UnitTestCase):
+    def test_handle_multiple_versions_matches_baseline(self):
+        rng = random.Random(42)
+        types = ["changed", "added", "removed", "comment", "communication"]
+
+        for _ in range(500):
+            count = rng.randint(2, 12)
+            timeline = [
+                get_activity(idx, rng.choice(types), rng.choice(["a", "b"]))
+                for idx in reversed(range(count))
+            ]
+
+            grouped = handle_multiple_versions(deepcopy(timeline))
+            baseline = baseline_handle_multiple_versions(deepcopy(timeline))
+
+            # the baseline listed a group after the activity that ended it
+            baseline.sort(key=lambda x: x["creation"], reverse=True)
+            self.assertEqual(grouped, baseline)
+
+    def test_handle_multiple_versions_groups_runs_by_owner(self):
+        timeline = [
+            get_activity(5, "changed", "a"),
+            get_activity(4, "added", "a"),
+            get_activity(3, "changed", "b"),
+            get_activity(2, "comment", "b"),
+            get_activity(1, "removed", "b"),
+            get_activity(0, "changed", "b"),
+        ]
+
+        grouped = handle_multiple_versions(timeline)
+
+        self.assertEqual(
+            [activity["name"] for activity in grouped],
+            ["ACT-5", "ACT-3", "ACT-2", "ACT-1"],
+        )
+        self.assertEqual([v["name"] for v in grouped[0]["other_versions"]], ["ACT-4"])
+        self.assertEqual([v["name"] for v in grouped[3]["other_versions"]], ["ACT-0"])
+        self.assertNotIn("other_versions", grouped[1])
+        self.assertNotIn("other_versions", timeline[0])
+
+    def test_handle_multiple_versions_keeps_a_single_version(self):
+        # the baseline dropped a timeline made of a single version
+        timeline = [get_activity(0, "changed", "a")]
+        self.assertEqual(handle_multiple_versions(timeline), timeline)
+
+    def test_feed_reads_email_status_live(self):
+        email = get_activity(0, "communication", "a")
+        email["data"] = {"delivery_status": "Sending", "read_by_recipient": 0}
+        rows = [
+            [frappe._dict(data=frappe.as_json(email))],
+            [frappe._dict(name="ACT-0", delivery_status="Sent", read_by_recipient=1)],
+        ]
+
+        with patch.object(crm_activity_feed.frappe, "get_all", side_effect=rows):
+            feed = crm_activity_feed.get_feed("Lead", "CRM-LEAD-1")
+
+        self.assertEqual(
+            feed[0]["data"], {"delivery_status": "Sent", "read_by_recipient": 1}
+        )
+
+
+class TestFeedVersionGrouping(UnitTestCase):
+    """Versions grouped when written to the feed, against an in-memory feed"""
+
+    def setUp(self):
+        self.rows = []
+
+        for target, attribute, fake in (
+            (crm_activity_feed.frappe.db, "get_value", self.get_latest_row),
+            (crm_activity_feed.frappe.db, "set_value", self.set_row),
+            (crm_activity_feed, "insert_rows", self.insert_rows),
+            (
+                activities,
+                "get_timeline_fields",
+                lambda doctype: {"status": {"label": "Status"}},
+            ),
+        ):
+            patcher = patch.object(target, attribute, side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_latest_row(self, doctype, filters, fields, order_by=None, as_dict=False):
+        if not self.rows:
+            return None
+        return frappe._dict(max(self.rows, key=lambda row: row["activity_on"]))
+
+    def set_row(self, doctype, name, values, update_modified=True):
+        row = next(row for row in self.rows if row["name"] == name)
+        row.update(values)
+
+    def insert_rows(self, rows):
+        for row in rows:
+            self.rows.append(
+                {
+                    **row,
+                    "name": f"FEED-{len(self.rows)}",
+                    "data": frappe.as_json(row["data"]),
+                }
+            )
+
+    def get_feed(self):
+        rows = sorted(self.rows, key=lambda row: row["activity_on"], reverse=True)
+        return [json.loads(row["data"]) for row in rows]
+
+    def add_version(self, idx, owner, old, new):
+        version = frappe._dict(
+            name=f"ACT-{idx}",
+            ref_doctype="Lead",
+            docname="CRM-LEAD-1",
+            owner=owner,
+            creation=NOW + timedelta(minutes=idx),
+            data=json.dumps({"changed": [["status", old, new]]}),
+        )
+        add_version(version)
+        return activities.get_version_activity(
+            version, "Lead", {"status": {"label": "Status"}}
+        )
+
+    def add_comment(self, idx, owner):
+        comment = get_activity(idx, "comment", owner)
+        self.insert_rows([crm_activity_feed.get_row("Lead", "CRM-LEAD-1", comment)])
+        return comment
+
+    def test_versions_by_the_same_owner_are_grouped(self):
+        self.add_version(0, "a", "Open", "Replied")
+        self.add_version(1, "a", "Replied", "Interested")
+
+        feed = self.get_feed()
+        self.assertEqual(len(feed), 1)
+        self.assertEqual(feed[0]["name"], "ACT-1")
+        self.assertEqual([v["name"] for v in feed[0]["other_versions"]], ["ACT-0"])
+
+    def test_versions_by_another_owner_are_not_grouped(self):
+        self.add_version(0, "a", "Open", "Replied")
+        self.add_version(1, "b", "Replied", "Interested")
+
+        self.assertEqual([a["name"] for a in self.get_feed()], ["ACT-1", "ACT-0"])
+
+    def test_feed_matches_grouping_on_read(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            self.rows = []
+            timeline = []
+            for idx in range(rng.randint(1, 12)):
+                owner = rng.choice(["a", "b"])
+                if rng.random() < 0.3:
+                    timeline.append(self.add_comment(idx, owner))
+                else:
+                    status = rng.choice(["", "Open", "Replied"])
+                    timeline.append(self.add_version(idx, owner, status, "Lost"))
+
+            timeline.reverse()
+            expected = json.loads(frappe.as_json(handle_multiple_versions(timeline)))
+            self.assertEqual(self.get_feed(), expected)
+
+    def test_sources_of_other_doctypes_are_skipped(self):
+        with patch.object(crm_activity_feed.frappe.db, "delete") as delete:
+            sync_source("Comment", "COMMENT-1", {("Customer", "CUST-1"), (None, None)})
+            delete.assert_not_called()
+
+
+@patch.object(activities.frappe, "has_permission")
+@patch.object(
+    activities.frappe.db, "exists", side_effect=lambda doctype, name: doctype == "Lead"
+)
+class TestActivityPage(UnitTestCase):
+    def get_timeline(self):
+        # many activities share a creation timestamp, as bulk edits do
+        timeline = []
+        for idx in range(23):
+            creation = NOW - timedelta(minutes=idx // 5)
+            timeline.append(get_activity(idx, "comment", "a", creation))
+        return timeline
+
+    def get_pages(self, timeline, page_length):
+        def get_timeline_sources(doctype, name, cursor, page_length, get_events=True):
+            # the sources read at or before the cursor, as `iter_timeline_records`
+            before = cursor and get_datetime(cursor["creation"])
+            return [
+                [
+                    activity
+                    for activity in timeline
+                    if not before or activity["creation"] <= before
+                ]
+            ]
+
+        pages, cursor = [], None
+        with patch.object(
+            activities, "get_timeline_sources", side_effect=get_timeline_sources
+        ):
+            while True:
+                page = get_activity_page("CRM-LEAD-1", cursor, page_length)
+                pages.append(page["activities"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    return pages
+                # the cursor is sent back as JSON
+                cursor = json.loads(frappe.as_json(cursor))
+
+    def test_pages_continue_across_equal_timestamps(self, exists, has_permission):
+        timeline = self.get_timeline()
+        for page_length in (1, 2, 3, 5, 7, 23, 30):
+            pages = self.get_pages(timeline, page_length)
+
+            self.assertEqual(
+                [activity["name"] for page in pages for activity in page],
+                [activity["name"] for activity in timeline],
+            )
+            self.assertTrue(all(len(page) <= page_length for page in pages))
@@ -0,0 +1,143 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+from next_crm.indexes import LIST_VIEW_DOCTYPES
+
+# Columns mirrored into the index and the kind of their rows. `_user_tags` is
+# left out: removing a tag deletes its Tag Link without running any hook.
+INDEXED_COLUMNS = {"_assign": "Assign", "_liked_by": "Like"}
+
+# Most records a filter is rewritten for, see `use_assignment_index`
+INDEX_LOOKUP_LIMIT = 500
+
+# Default set once every list doctype has been indexed, see `is_index_built`
+INDEX_BUILT_KEY = "crm_assignment_index_built"
+
+
+class CRMAssignmentIndex(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index(
+        "CRM Assignment Index",
+        ["reference_doctype", "kind", "value", "reference_name"],
+    )
+    frappe.db.add_index("CRM Assignment Index", ["reference_doctype", "reference_name"])
+
+
+def is_index_built():
+    return bool(frappe.db.get_default(INDEX_BUILT_KEY))
+
+
+def get_indexed_names(doctype, column, value, limit=None):
+    """Returns the names of the `doctype` records whose `column` contains `value`"""
+    return frappe.get_all(
+        "CRM Assignment Index",
+        filters={
+            "reference_doctype": doctype,
+            "kind": INDEXED_COLUMNS[column],
+            "value": value,
+        },
+        order_by=None,
+        limit=limit,
+        pluck="reference_name",
+    )
+
+
+def parse_column(column, value):
+    """Returns the users stored in an `_assign` or `_liked_by` value"""
+    if not value:
+        return []
+    return frappe.parse_json(value) or []
+
+
+def sync_reference(doctype, name, columns=None):
+    """Replaces the index rows of `doctype` `name` with its current `columns`"""
+    if doctype not in LIST_VIEW_DOCTYPES or not name:
+        return
+
+    columns = columns or list(INDEXED_COLUMNS)
+    record = frappe.db.get_value(doctype, name, columns, as_dict=True)
+
+    frappe.db.delete(
+        "CRM Assignment Index",
+        {
+            "reference_doctype": doctype,
+            "reference_name": name,
+            "kind": ["in", [INDEXED_COLUMNS[column] for column in columns]],
+        },
+    )
+    if record:
+        insert_rows(doctype, [{"name": name, **record}], columns)
+
+
+def insert_rows(doctype, records, columns):
+    timestamp = now()
+    values = []
+    for record in records:
+        for column in columns:
+            for value in dict.fromkeys(parse_column(column, record.get(column))):
+                values.append(
+                    (
+                        frappe.generate_hash(length=10),
+                        doctype,
+                        record.get("name"),
+                        INDEXED_COLUMNS[column],
+                        value,
+                        timestamp,
+                        timestamp,
+                        "Administrator",
+                        "Administrator",
+                    )
+                )
+
+    if values:
+        frappe.db.bulk_insert(
+            "CRM Assignment Index",
+            fields=[
+                "name",
+                "reference_doctype",
+                "reference_name",
+                "kind",
+                "value",
+                "creation",
+                "modified",
+                "owner",
+                "modified_by",
+            ],
+            values=values,
+        )
+
+
+def rebuild_index(doctypes=LIST_VIEW_DOCTYPES, chunk_size=5000):
+    """Rebuilds the index of `doctypes` from their `_assign` and `_liked_by` columns"""
+    columns = list(INDEXED_COLUMNS)
+    for doctype in doctypes:
+        if not frappe.db.table_exists(doctype):
+            continue
+
+        frappe.db.delete("CRM Assignment Index", {"reference_doctype": doctype})
+
+        start = 0
+        while True:
+            records = frappe.get_all(
+                doctype,
+                fields=["name", *columns],
+                or_filters=[[column, "is", "set"] for column in columns],
+                order_by="name asc",
+                start=start,
+                page_length=chunk_size,
+            )
+            insert_rows(doctype, records, columns)
+            frappe.db.commit()
+
+            if len(records) < chunk_size:
+                break
+            start += chunk_size
+
+    frappe.db.set_default(INDEX_BUILT_KEY, 1)
@@ -0,0 +1,133 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+from frappe.tests import UnitTestCase
+
+from next_crm.api import doc
+from next_crm.api.doc import use_assignment_index
+from next_crm.ncrm.doctype.crm_assignment_index.crm_assignment_index import parse_column
+
+INDEX = {
+    ("_assign", "jane@example.com"): ["CRM-LEAD-1", "CRM-LEAD-2"],
+    ("_assign", "john@example.com"): ["CRM-LEAD-2", "CRM-LEAD-3"],
+    ("_liked_by", "jane@example.com"): ["CRM-LEAD-2"],
+}
+
+
+USERS = ("jane@example.com", "john@example.com", "nobody@example.com")
+
+
+def get_indexed_names(doctype, column, value, limit=None):
+    return INDEX.get((column, value), [])[:limit]
+
+
+@patch.object(doc, "is_user_id", side_effect=lambda value: value in USERS)
+@patch.object(doc, "get_indexed_names", side_effect=get_indexed_names)
+@patch.object(doc, "is_index_built", return_value=True)
+class TestCRMAssignmentIndex(UnitTestCase):
+    def test_like_filter_is_rewritten(self, is_index_built, indexed_names, is_user_id):
+        filters = use_assignment_index(
+            "Lead", {"_assign": ["like", "%jane@example.com%"], "status": "Open"}
+        )
+
+        self.assertEqual(
+            filters,
+            {"status": "Open", "name": ["in", ["CRM-LEAD-1", "CRM-LEAD-2"]]},
+        )
+
+    def test_like_filters_are_intersected(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = use_assignment_index(
+            "Lead",
+            {
+                "_assign": ["like", "%john@example.com%"],
+                "_liked_by": ["like", "%jane@example.com%"],
+            },
+        )
+
+        self.assertEqual(filters, {"name": ["in", ["CRM-LEAD-2"]]})
+
+    def test_not_like_filter_is_rewritten(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = use_assignment_index(
+            "Lead", {"_assign": ["not like", "%john@example.com%"]}
+        )
+
+        self.assertEqual(filters, {"name": ["not in", ["CRM-LEAD-2", "CRM-LEAD-3"]]})
+
+    def test_not_like_is_removed_from_like(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = use_assignment_index(
+            "Lead",
+            {
+                "_assign": ["like", "%jane@example.com%"],
+                "_liked_by": ["not like", "%jane@example.com%"],
+            },
+        )
+
+        self.assertEqual(filters, {"name": ["in", ["CRM-LEAD-1"]]})
+
+    def test_no_match_keeps_an_empty_name_filter(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = use_assignment_index(
+            "Lead", {"_assign": ["like", "%nobody@example.com%"]}
+        )
+
+        self.assertEqual(filters, {"name": ["in", []]})
+
+    def test_non_indexed_doctype_keeps_its_filters(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = {"_assign": ["like", "%jane@example.com%"]}
+
+        self.assertEqual(
+            use_assignment_index("Item", dict(filters)),
+            filters,
+        )
+        indexed_names.assert_not_called()
+
+    def test_other_filters_are_kept(self, is_index_built, indexed_names, is_user_id):
+        for filters in (
+            # a name filter of the list itself
+            {"_assign": ["like", "%jane@example.com%"], "name": "CRM-LEAD-1"},
+            # not a whole user, typed in the filter as a part of one
+            {"_assign": ["like", "%john%"]},
+            {"_liked_by": ["not like", "%example.com%"]},
+            {"_assign": ["like", "jane%"]},
+            {"_assign": ["=", "%jane@example.com%"]},
+            # tags are not indexed
+            {"_user_tags": ["like", "%hot%"]},
+        ):
+            self.assertEqual(use_assignment_index("Lead", dict(filters)), filters)
+
+        indexed_names.assert_not_called()
+
+    def test_users_with_many_records_keep_their_filter(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        filters = {"_assign": ["like", "%jane@example.com%"]}
+
+        with patch.object(doc, "INDEX_LOOKUP_LIMIT", 1):
+            self.assertEqual(use_assignment_index("Lead", dict(filters)), filters)
+
+    def test_filters_are_kept_until_the_index_is_built(
+        self, is_index_built, indexed_names, is_user_id
+    ):
+        is_index_built.return_value = False
+        filters = {"_assign": ["like", "%jane@example.com%"]}
+
+        self.assertEqual(use_assignment_index("Lead", dict(filters)), filters)
+
+    def test_parse_column(self, is_index_built, indexed_names, is_user_id):
+        self.assertEqual(
+            parse_column("_assign", '["jane@example.com", "john@example.com"]'),
+            ["jane@example.com", "john@example.com"],
+        )
+        self.assertEqual(parse_column("_liked_by", None), [])
+        self.assertEqual(parse_column("_liked_by", "[]"), [])
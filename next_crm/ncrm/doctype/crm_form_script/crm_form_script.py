@@ -1,6 +1,8 @@
 # Copyright (c) 2023, Frappe Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
+import hashlib
+
 import frappe
 from frappe import _
 from frappe.model.document import Document
@@ -30,9 +32,64 @@ class CRMFormScript(Document):
                     _("You need to be in developer mode to edit a Standard Form Script")
                 )
 
+    def on_update(self):
+        clear_form_script_cache(self.dt)
+        doc_before_save = self.get_doc_before_save()
+        if doc_before_save and doc_before_save.dt != self.dt:
+            clear_form_script_cache(doc_before_save.dt)
+
+    def on_trash(self):
+        clear_form_script_cache(self.dt)
+
+
+FORM_SCRIPT_CACHE_KEY = "next_crm:form_script"
+
 
 def get_form_script(dt, view="Form"):
     """Returns the form script for the given doctype"""
+    return get_cached_form_script(dt, view)["script"]
+
+
+def get_form_script_hash(dt, view="Form"):
+    """Returns a hash of the form script for the given doctype, which changes whenever the script does"""
+    return get_cached_form_script(dt, view)["content_hash"]
+
+
+@frappe.whitelist()
+def get_script(dt, view="Form", content_hash=None):
+    """
+    Returns the form script of the given doctype with its hash, or only the
+    hash if it matches `content_hash`, so clients can cache scripts.
+    """
+    frappe.has_permission(dt, "read", throw=True)
+
+    cached = get_cached_form_script(dt, view)
+    if content_hash and content_hash == cached["content_hash"]:
+        return {"content_hash": cached["content_hash"], "not_modified": True}
+
+    return {**cached, "not_modified": False}
+
+
+def get_cached_form_script(dt, view="Form"):
+    key = f"{dt}:{view}"
+    cached = frappe.cache.hget(FORM_SCRIPT_CACHE_KEY, key)
+    if cached is None:
+        script = query_form_script(dt, view)
+        cached = {
+            "script": script,
+            "content_hash": hashlib.sha256(frappe.as_json(script).encode()).hexdigest(),
+        }
+        frappe.cache.hset(FORM_SCRIPT_CACHE_KEY, key, cached)
+
+    return cached
+
+
+def clear_form_script_cache(dt):
+    for view in ("Form", "List"):
+        frappe.cache.hdel(FORM_SCRIPT_CACHE_KEY, f"{dt}:{view}")
+
+
+def query_form_script(dt, view="Form"):
     FormScript = frappe.qb.DocType("CRM Form Script")
     query = (
         frappe.qb.from_(FormScript)
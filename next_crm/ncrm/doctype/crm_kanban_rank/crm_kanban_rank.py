@@ -0,0 +1,201 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+
+# Smallest gap kept between two positions before they are renumbered
+MIN_POSITION_GAP = 1e-6
+
+# Gap between the positions of cards anchored to the same card
+POSITION_STEP = 1024
+
+
+class CRMKanbanRank(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_unique(
+        "CRM Kanban Rank",
+        ["reference_doctype", "view", "reference_name"],
+        constraint_name="unique_reference_view",
+    )
+    frappe.db.add_index(
+        "CRM Kanban Rank",
+        ["reference_doctype", "view", "column_name", "anchor", "position"],
+    )
+
+
+def get_rank_view(view=None):
+    """
+    Returns the key the positions of `view` are stored under. Default views,
+    which are saved only once changed, share the key of the user's default.
+    """
+    if not view or frappe.get_cached_value("CRM View Settings", view, "is_default"):
+        return f"{frappe.session.user}:default"
+    return view
+
+
+def validate_rank_view(doctype, view=None):
+    """Throws unless `view` is a kanban view of `doctype` the user may change"""
+    if not view:
+        return
+
+    settings = frappe.db.get_value(
+        "CRM View Settings", view, ["dt", "user", "is_default"], as_dict=True
+    )
+    if not settings or settings.dt != doctype:
+        frappe.throw(
+            _("View {0} does not exist").format(view), frappe.DoesNotExistError
+        )
+
+    frappe.has_permission("CRM View Settings", "write", view, throw=True)
+    if settings.user:
+        if settings.user != frappe.session.user:
+            frappe.throw(_("Not permitted"), frappe.PermissionError)
+    elif (
+        frappe.session.user != "Administrator"
+        and "Sales Manager" not in frappe.get_roles()
+    ):
+        frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+
+@frappe.whitelist()
+def update_rank(doctype, name, column, name_above=None, name_below=None, view=None):
+    """
+    Places the card `name` in the kanban `column` between the cards
+    `name_above` and `name_below`, as shown on the board.
+
+    Cards that were never moved by hand follow the view's sort order. A
+    moved card is anchored to the nearest such card above it and keeps its
+    place right below that card, among the other cards anchored to it,
+    however the sort order changes. Only the moved card is written.
+    """
+    frappe.has_permission(doctype, "write", name, throw=True)
+    validate_rank_view(doctype, view)
+
+    view = get_rank_view(view)
+    anchor, above, below = get_drop_place(doctype, view, column, name_above, name_below)
+
+    position = get_position_between(above, below)
+    if position is None:
+        renumber_positions(doctype, view, column, anchor)
+        anchor, above, below = get_drop_place(
+            doctype, view, column, name_above, name_below
+        )
+        position = get_position_between(above, below)
+
+    set_position(doctype, view, column, name, position, anchor)
+    return position
+
+
+def get_drop_place(doctype, view, column, name_above, name_below):
+    """
+    Returns the anchor of a card dropped between `name_above` and
+    `name_below` and the positions of those of them anchored to it too.
+    """
+    ranks = get_ranks(doctype, view, column, [name_above, name_below])
+    rank_above = ranks.get(name_above)
+    rank_below = ranks.get(name_below)
+
+    if not name_above:
+        anchor, above = None, None
+    elif rank_above:
+        anchor, above = rank_above.anchor or None, rank_above.position
+    else:
+        anchor, above = name_above, None
+
+    below = None
+    if rank_below and (rank_below.anchor or None) == anchor:
+        below = rank_below.position
+
+    return anchor, above, below
+
+
+def get_position_between(above, below):
+    """Returns the position between the neighbouring cards, or None if there is no room left"""
+    if above is None and below is None:
+        return POSITION_STEP
+    if above is None:
+        return below - POSITION_STEP
+    if below is None or below <= above:
+        return above + POSITION_STEP
+    if below - above < 2 * MIN_POSITION_GAP:
+        return None
+    return (above + below) / 2
+
+
+def get_ranks(doctype, view, column, names):
+    """Returns a `{name: rank}` map of the cards of `column` that were moved by hand"""
+    names = [name for name in names if name]
+    if not names:
+        return {}
+
+    ranks = frappe.get_all(
+        "CRM Kanban Rank",
+        filters={
+            "reference_doctype": doctype,
+            "view": view,
+            "column_name": column,
+            "reference_name": ["in", names],
+        },
+        fields=["reference_name", "anchor", "position"],
+    )
+    return {rank.reference_name: rank for rank in ranks}
+
+
+def set_position(doctype, view, column, name, position, anchor=None):
+    rank = frappe.db.get_value(
+        "CRM Kanban Rank",
+        {"reference_doctype": doctype, "view": view, "reference_name": name},
+    )
+    if rank:
+        frappe.db.set_value(
+            "CRM Kanban Rank",
+            rank,
+            {"column_name": column, "anchor": anchor, "position": position},
+        )
+        return
+
+    frappe.get_doc(
+        {
+            "doctype": "CRM Kanban Rank",
+            "reference_doctype": doctype,
+            "reference_name": name,
+            "view": view,
+            "column_name": column,
+            "anchor": anchor,
+            "position": position,
+        }
+    ).insert(ignore_permissions=True)
+
+
+def renumber_positions(doctype, view, column, anchor):
+    """Spreads the positions of the cards anchored to `anchor` evenly, keeping their order"""
+    ranks = frappe.get_all(
+        "CRM Kanban Rank",
+        filters={
+            "reference_doctype": doctype,
+            "view": view,
+            "column_name": column,
+            "anchor": anchor or ["is", "not set"],
+        },
+        order_by="position asc",
+        pluck="name",
+    )
+    for idx, rank in enumerate(ranks):
+        frappe.db.set_value(
+            "CRM Kanban Rank", rank, "position", (idx + 1) * POSITION_STEP
+        )
+
+
+def delete_view_ranks(view):
+    frappe.db.delete("CRM Kanban Rank", {"view": view})
+
+
+def delete_reference_ranks(doctype, name):
+    frappe.db.delete(
+        "CRM Kanban Rank", {"reference_doctype": doctype, "reference_name": name}
+    )
@@ -0,0 +1,177 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from next_crm.ncrm.doctype.crm_kanban_rank import crm_kanban_rank
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import (
+    MIN_POSITION_GAP,
+    POSITION_STEP,
+    get_drop_place,
+    get_position_between,
+    update_rank,
+    validate_rank_view,
+)
+
+
+def rank(anchor, position):
+    return frappe._dict(anchor=anchor, position=position)
+
+
+class TestCRMKanbanRank(UnitTestCase):
+    def test_position_between_neighbours(self):
+        self.assertEqual(get_position_between(1024, 2048), 1536)
+        self.assertEqual(get_position_between(1536, 2048), 1792)
+        self.assertEqual(get_position_between(0.5, 0.75), 0.625)
+
+    def test_position_at_the_edges(self):
+        # the first card anchored to a card
+        self.assertEqual(get_position_between(None, None), POSITION_STEP)
+        # dropped first among the cards anchored to the same card
+        self.assertEqual(get_position_between(None, 1024), 0)
+        self.assertEqual(get_position_between(None, 0), -POSITION_STEP)
+        # dropped last among them
+        self.assertEqual(get_position_between(2048, None), 3072)
+
+    def test_position_with_neighbours_out_of_order(self):
+        # a stale board may send a card below with a lower position
+        self.assertEqual(get_position_between(2048, 1024), 3072)
+
+    def test_no_room_between_neighbours(self):
+        self.assertIsNone(get_position_between(1024, 1024 + MIN_POSITION_GAP))
+        self.assertIsNotNone(get_position_between(1024, 1024 + 3 * MIN_POSITION_GAP))
+
+    def test_midpoints_keep_the_order(self):
+        above, below = 1024, 2048
+        for _ in range(20):
+            position = get_position_between(above, below)
+            self.assertLess(above, position)
+            self.assertLess(position, below)
+            below = position
+
+    def test_drop_below_an_unranked_card_anchors_to_it(self):
+        with patch.object(crm_kanban_rank, "get_ranks", return_value={}):
+            self.assertEqual(
+                get_drop_place("Lead", "view", "Open", "CRM-LEAD-1", "CRM-LEAD-2"),
+                ("CRM-LEAD-1", None, None),
+            )
+
+    def test_drop_below_a_ranked_card_shares_its_anchor(self):
+        ranks = {
+            "CRM-LEAD-1": rank("CRM-LEAD-9", 1024),
+            "CRM-LEAD-2": rank("CRM-LEAD-9", 2048),
+        }
+        with patch.object(crm_kanban_rank, "get_ranks", return_value=ranks):
+            self.assertEqual(
+                get_drop_place("Lead", "view", "Open", "CRM-LEAD-1", "CRM-LEAD-2"),
+                ("CRM-LEAD-9", 1024, 2048),
+            )
+
+    def test_card_below_of_another_anchor_is_not_a_bound(self):
+        ranks = {
+            "CRM-LEAD-1": rank("CRM-LEAD-9", 1024),
+            "CRM-LEAD-2": rank("CRM-LEAD-8", 512),
+        }
+        with patch.object(crm_kanban_rank, "get_ranks", return_value=ranks):
+            self.assertEqual(
+                get_drop_place("Lead", "view", "Open", "CRM-LEAD-1", "CRM-LEAD-2"),
+                ("CRM-LEAD-9", 1024, None),
+            )
+
+    def test_drop_on_top_has_no_anchor(self):
+        ranks = {"CRM-LEAD-2": rank(None, 1024)}
+        with patch.object(crm_kanban_rank, "get_ranks", return_value=ranks):
+            self.assertEqual(
+                get_drop_place("Lead", "view", "Open", None, "CRM-LEAD-2"),
+                (None, None, 1024),
+            )
+
+    @patch.object(crm_kanban_rank, "set_position")
+    @patch.object(crm_kanban_rank, "get_ranks", return_value={})
+    @patch.object(crm_kanban_rank, "validate_rank_view")
+    @patch.object(crm_kanban_rank.frappe, "has_permission")
+    def test_drop_between_unranked_cards_writes_only_the_moved_card(
+        self, has_permission, validate_rank_view, get_ranks, set_position
+    ):
+        position = update_rank(
+            "Lead",
+            "CRM-LEAD-3",
+            "Open",
+            name_above="CRM-LEAD-1",
+            name_below="CRM-LEAD-2",
+        )
+
+        self.assertEqual(position, POSITION_STEP)
+        has_permission.assert_called_once_with(
+            "Lead", "write", "CRM-LEAD-3", throw=True
+        )
+        set_position.assert_called_once()
+        self.assertEqual(
+            set_position.call_args.args[3:], ("CRM-LEAD-3", position, "CRM-LEAD-1")
+        )
+
+    @patch.object(crm_kanban_rank, "set_position")
+    @patch.object(crm_kanban_rank, "renumber_positions")
+    @patch.object(crm_kanban_rank, "validate_rank_view")
+    @patch.object(crm_kanban_rank.frappe, "has_permission")
+    def test_full_slot_is_renumbered_before_placing(
+        self, has_permission, validate_rank_view, renumber_positions, set_position
+    ):
+        stored = [
+            {
+                "CRM-LEAD-1": rank("CRM-LEAD-9", 1024.0),
+                "CRM-LEAD-2": rank("CRM-LEAD-9", 1024.0 + MIN_POSITION_GAP),
+            },
+            {
+                "CRM-LEAD-1": rank("CRM-LEAD-9", 1024.0),
+                "CRM-LEAD-2": rank("CRM-LEAD-9", 2048.0),
+            },
+        ]
+        with patch.object(crm_kanban_rank, "get_ranks", side_effect=stored):
+            position = update_rank(
+                "Lead",
+                "CRM-LEAD-3",
+                "Open",
+                name_above="CRM-LEAD-1",
+                name_below="CRM-LEAD-2",
+            )
+
+        renumber_positions.assert_called_once()
+        self.assertEqual(renumber_positions.call_args.args[3], "CRM-LEAD-9")
+        self.assertEqual(position, 1536)
+        self.assertEqual(set_position.call_args.args[5], "CRM-LEAD-9")
+
+    @patch.object(crm_kanban_rank.frappe.db, "set_value")
+    @patch.object(crm_kanban_rank.frappe, "get_all", return_value=["a", "b", "c"])
+    def test_renumber_positions_of_an_anchor(self, get_all, set_value):
+        crm_kanban_rank.renumber_positions("Lead", "view", "Open", None)
+
+        self.assertEqual(
+            get_all.call_args.kwargs["filters"]["anchor"], ["is", "not set"]
+        )
+        self.assertEqual(
+            [call.args[3] for call in set_value.call_args_list],
+            [1024, 2048, 3072],
+        )
+
+    @patch.object(crm_kanban_rank.frappe, "has_permission")
+    def test_rank_view_of_another_user(self, has_permission):
+        settings = frappe._dict(dt="Lead", user="someone@example.com", is_default=0)
+        with patch.object(
+            crm_kanban_rank.frappe.db, "get_value", return_value=settings
+        ):
+            self.assertRaises(
+                frappe.PermissionError, validate_rank_view, "Lead", "Someone's View"
+            )
+
+    def test_rank_view_of_another_doctype(self):
+        settings = frappe._dict(dt="Opportunity", user="", is_default=0)
+        with patch.object(
+            crm_kanban_rank.frappe.db, "get_value", return_value=settings
+        ):
+            self.assertRaises(
+                frappe.DoesNotExistError, validate_rank_view, "Lead", "Pipeline"
+            )
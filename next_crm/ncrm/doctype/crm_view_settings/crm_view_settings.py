@@ -1,14 +1,82 @@
 # Copyright (c) 2023, Frappe Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 import json
+from copy import deepcopy
 
 import frappe
 from frappe.model.document import Document, get_controller
 from frappe.utils import parse_json
 
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import delete_view_ranks
+
 
 class CRMViewSettings(Document):
-    pass
+    def on_update(self):
+        clear_view_cache(self.dt)
+
+    def on_trash(self):
+        clear_view_cache(self.dt)
+        delete_view_ranks(self.name)
+
+
+def get_compiled_view(doctype, view_type="list", view_name=None, user=None):
+    """
+    Returns the parsed settings of the view `view_name`, or of the user's
+    default view of `view_type` if no name is given, from the cache.
+
+    Entries are keyed by (user, doctype, view type, view name) and cleared for
+    the whole doctype whenever one of its views changes.
+    """
+    user = user or frappe.session.user
+    key = f"{user}:{view_type or ''}:{view_name or ''}"
+
+    compiled = frappe.cache.hget(get_view_cache_key(doctype), key)
+    if compiled is None:
+        compiled = compile_view(doctype, view_type, view_name, user) or {}
+        frappe.cache.hset(get_view_cache_key(doctype), key, compiled)
+
+    return frappe._dict(deepcopy(compiled)) if compiled else None
+
+
+def compile_view(doctype, view_type, view_name, user):
+    if view_name:
+        name = frappe.db.exists("CRM View Settings", view_name)
+    else:
+        name = frappe.db.exists(
+            "CRM View Settings",
+            {"dt": doctype, "type": view_type, "is_default": 1, "user": user},
+        )
+
+    if not name:
+        return None
+
+    doc = frappe.get_doc("CRM View Settings", name)
+    if doc.dt != doctype:
+        return None
+
+    return {
+        "name": doc.name,
+        "label": doc.label,
+        "type": doc.type,
+        "filters": parse_json(doc.filters or "{}") or {},
+        "order_by": doc.order_by,
+        "group_by_field": doc.group_by_field,
+        "column_field": doc.column_field,
+        "title_field": doc.title_field,
+        "columns": parse_json(doc.columns or "[]"),
+        "rows": parse_json(doc.rows or "[]"),
+        "kanban_columns": parse_json(doc.kanban_columns or "[]"),
+        "kanban_fields": parse_json(doc.kanban_fields or "[]"),
+        "load_default_columns": doc.load_default_columns,
+    }
+
+
+def get_view_cache_key(doctype):
+    return f"next_crm:compiled_views:{doctype}"
+
+
+def clear_view_cache(doctype):
+    frappe.cache.delete_value(get_view_cache_key(doctype))
 
 
 @frappe.whitelist()
@@ -237,3 +305,6 @@ def reset_default_open_view(doctype):
 
     for view in views:
         frappe.db.set_value("CRM View Settings", view, "default_open_view", 0)
+
+    if views:
+        clear_view_cache(doctype)
@@ -0,0 +1,5 @@
+def execute():
+    from next_crm.ncrm.doctype.crm_activity_feed.crm_activity_feed import rebuild_feed
+
+    # queues one job per chunk of documents, see `rebuild_feed_chunk`
+    rebuild_feed()
@@ -0,0 +1,13 @@
+def execute():
+    from frappe import enqueue
+
+    from next_crm.ncrm.doctype.crm_assignment_index.crm_assignment_index import (
+        rebuild_index,
+    )
+
+    enqueue(
+        rebuild_index,
+        queue="long",
+        timeout=3600,
+        enqueue_after_commit=True,
+    )
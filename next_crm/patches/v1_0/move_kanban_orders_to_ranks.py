@@ -0,0 +1,53 @@
+import json
+
+import frappe
+from frappe.utils import update_progress_bar
+
+from next_crm.ncrm.doctype.crm_kanban_rank.crm_kanban_rank import (
+    POSITION_STEP,
+    set_position,
+)
+from next_crm.ncrm.doctype.crm_view_settings.crm_view_settings import clear_view_cache
+
+
+def execute():
+    views = frappe.get_all(
+        "CRM View Settings",
+        filters={"type": "kanban"},
+        fields=["name", "dt", "user", "is_default", "kanban_columns"],
+    )
+    total_views = len(views)
+    for index, view in enumerate(views):
+        update_progress_bar("Moving kanban orders to ranks", index, total_views)
+
+        try:
+            kanban_columns = json.loads(view.kanban_columns or "[]")
+        except Exception as e:
+            frappe.log_error(
+                f"Failed to parse kanban columns JSON in CRM View Settings {view.name}: {e}"
+            )
+            continue
+
+        if not any(column.get("order") for column in kanban_columns):
+            continue
+
+        # default views are opened without a view name, see `get_rank_view`
+        rank_view = f"{view.user}:default" if view.is_default else view.name
+        for column in kanban_columns:
+            for idx, name in enumerate(column.pop("order", None) or []):
+                set_position(
+                    view.dt,
+                    rank_view,
+                    column.get("name"),
+                    name,
+                    (idx + 1) * POSITION_STEP,
+                )
+
+        frappe.db.set_value(
+            "CRM View Settings",
+            view.name,
+            "kanban_columns",
+            json.dumps(kanban_columns),
+            update_modified=False,
+        )
+        clear_view_cache(view.dt)
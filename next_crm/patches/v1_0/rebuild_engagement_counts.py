@@ -0,0 +1,15 @@
+def execute():
+    from frappe import enqueue
+
+    from next_crm.api.doc import rebuild_engagement_counts
+    from next_crm.install import add_engagement_count_custom_fields
+
+    # fixtures are synced after the patches, the job needs the fields
+    add_engagement_count_custom_fields()
+
+    enqueue(
+        rebuild_engagement_counts,
+        queue="long",
+        timeout=3600,
+        enqueue_after_commit=True,
+    )
@@ -1,8 +1,12 @@
+from copy import deepcopy
 from datetime import datetime
 
 import frappe
 from frappe.utils import get_datetime
 
+# Roles whose users make up the sales team
+SALES_TEAM_ROLES = ("Sales User", "Sales Manager", "Sales Master Manager")
+
 
 def get_duration(from_date, to_date):
     if not isinstance(from_date, datetime):
@@ -30,3 +34,78 @@ def get_linked_gmail_thread_list(doctype, docname):
         pluck="name",
     )
     return gmail_threads
+
+
+def get_cached_field_projection(doctype, projection, build):
+    """
+    Returns `build(doctype)`, a list derived from the fields of `doctype`,
+    from the shared cache. An entry is rebuilt when the meta of `doctype` has
+    been modified since it was cached, and all entries of a doctype are cleared
+    when its Custom Fields or Property Setters change.
+
+    Labels should be cached untranslated and translated by the caller, every
+    call returns a copy that is safe to modify.
+    """
+    key = f"next_crm:field_projections:{doctype}"
+    meta_version = str(frappe.get_meta(doctype).modified)
+
+    cached = frappe.cache.hget(key, projection)
+    if not cached or cached.get("meta_version") != meta_version:
+        cached = {"meta_version": meta_version, "value": build(doctype)}
+        frappe.cache.hset(key, projection, cached)
+
+    return deepcopy(cached["value"])
+
+
+def clear_field_projection_cache(doctype):
+    frappe.cache.delete_value(f"next_crm:field_projections:{doctype}")
+
+
+def get_role_users(roles):
+    """Returns the set of users having any of `roles`"""
+    return get_role_holders("User", roles)
+
+
+def get_role_holders(parenttype, roles):
+    """
+    Returns the set of `parenttype` documents, users or reports, having any of
+    `roles`, from the shared cache. Entries are cleared whenever a user, report
+    or role changes.
+    """
+    if isinstance(roles, str):
+        roles = [roles]
+
+    holders = set()
+    for role in roles:
+        key = f"{parenttype}:{role}"
+        role_holders = frappe.cache.hget("next_crm:role_holders", key)
+        if role_holders is None:
+            role_holders = frappe.get_all(
+                "Has Role",
+                filters={"role": role, "parenttype": parenttype},
+                pluck="parent",
+                distinct=True,
+            )
+            frappe.cache.hset("next_crm:role_holders", key, role_holders)
+        holders.update(role_holders)
+
+    return holders
+
+
+def get_sales_team_members():
+    return get_role_users(SALES_TEAM_ROLES)
+
+
+def clear_role_holders_cache():
+    frappe.cache.delete_value("next_crm:role_holders")
+
+
+def clear_cache():
+    """Clears the shared caches of the app, they have no expiry of their own"""
+    from next_crm.ncrm.doctype.crm_form_script.crm_form_script import (
+        FORM_SCRIPT_CACHE_KEY,
+    )
+
+    frappe.cache.delete_keys("next_crm:field_projections:")
+    frappe.cache.delete_keys("next_crm:compiled_views:")
+    frappe.cache.delete_value(["next_crm:role_holders", FORM_SCRIPT_CACHE_KEY])